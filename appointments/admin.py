@@ -1,12 +1,19 @@
 # appointments/admin.py
 
+from datetime import timedelta
+
 from django.contrib import admin, messages
+from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.urls import path
+from django.utils import timezone
 from django import forms
-import csv, io, chardet
 
-from .models import Profile, Appointment, AuditLog, MedicalTestSchedule
+from . import exports
+from .models import (
+    Profile, Appointment, AuditLog, MedicalTestSchedule, ImportJob,
+    Ward, StaffLeave, ClinicClosure,
+)
 
 
 @admin.register(Profile)
@@ -25,14 +32,63 @@ class AppointmentAdmin(admin.ModelAdmin):
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
-    list_display  = ('user', 'action', 'timestamp')
-    search_fields = ('user__username', 'action')
+    list_display   = ('user', 'kind', 'appointment_id', 'action', 'timestamp')
+    list_filter    = ('kind',)
+    date_hierarchy = 'timestamp'
+    # exact matches only: a number is an appointment id, anything else a
+    # username. Both are indexed, unlike a LIKE over the action text.
+    search_fields  = ('=user__username',)
+    search_help_text = "Exact username or appointment id"
+    list_select_related = ('user',)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term.isdigit():
+            return queryset.filter(appointment_id=int(term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display    = ('id', 'status', 'dry_run', 'rows_processed', 'uploaded_by', 'created_at', 'finished_at')
+    list_filter     = ('status',)
+    readonly_fields = ('status', 'rows_processed', 'report', 'error', 'worker', 'started_at', 'heartbeat_at',
+                       'finished_at')
+
+
+@admin.register(Ward)
+class WardAdmin(admin.ModelAdmin):
+    list_display = ('code', 'capacity', 'active')
+    list_filter  = ('active',)
+
+
+@admin.register(StaffLeave)
+class StaffLeaveAdmin(admin.ModelAdmin):
+    list_display = ('staff', 'start_date', 'end_date', 'reason')
+    list_filter  = ('staff',)
+
+
+@admin.register(ClinicClosure)
+class ClinicClosureAdmin(admin.ModelAdmin):
+    list_display = ('date', 'reason')
 
 
 class CSVUploadForm(forms.Form):
     csv_file = forms.FileField(
         help_text="Upload a CSV file with columns: full name, matric_no, department"
     )
+    dry_run = forms.BooleanField(
+        required=False,
+        help_text="Only report what would be created or changed"
+    )
+
+
+class ExportForm(forms.Form):
+    date_from  = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to    = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    ward       = forms.CharField(required=False, max_length=10)
+    department = forms.CharField(required=False, max_length=100)
+    format     = forms.ChoiceField(choices=[(f, f.upper()) for f in exports.formats()])
 
 
 @admin.register(MedicalTestSchedule)
@@ -54,6 +110,8 @@ class MedicalTestScheduleAdmin(admin.ModelAdmin):
         'student__matric_no',
         'student__user__username',
     )
+    # __str__ of both columns follows these, once per row otherwise
+    list_select_related = ('student__user', 'staff')
 
     change_list_template = "admin/appointments/medicaltestschedule_changelist.html"
 
@@ -79,6 +137,16 @@ class MedicalTestScheduleAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.upload_csv),
                 name='appointments_medicaltestschedule_upload_csv'
             ),
+            path(
+                'export/',
+                self.admin_site.admin_view(self.export),
+                name='appointments_medicaltestschedule_export'
+            ),
+            path(
+                'import-progress/',
+                self.admin_site.admin_view(self.import_progress),
+                name='appointments_medicaltestschedule_import_progress'
+            ),
         ]
         return custom + urls
 
@@ -86,22 +154,17 @@ class MedicalTestScheduleAdmin(admin.ModelAdmin):
         if request.method == 'POST':
             form = CSVUploadForm(request.POST, request.FILES)
             if form.is_valid():
-                raw = form.cleaned_data['csv_file'].read()
-                detected = chardet.detect(raw)
-                enc = detected.get('encoding') or 'utf-8'
-                text = raw.decode(enc, errors='replace')
-                sio = io.StringIO(text, newline='')
-                try:
-                    reader = csv.DictReader(sio)
-                    schedules = list(reader)
-                except csv.Error as e:
-                    self.message_user(request, f"CSV error: {e}", level=messages.ERROR)
-                    return redirect(request.path)
-
-                from .utils import allocate_medical_tests
-                allocate_medical_tests(schedules)
-
-                self.message_user(request, "Medical tests scheduled.", level=messages.SUCCESS)
+                # the import itself runs in the `run_import_worker` process
+                job = ImportJob.objects.create(
+                    csv_file=form.cleaned_data['csv_file'],
+                    dry_run=form.cleaned_data['dry_run'],
+                    uploaded_by=request.user,
+                )
+                self.message_user(
+                    request,
+                    f"Import #{job.pk} queued. Progress is shown below.",
+                    level=messages.SUCCESS
+                )
                 return redirect('admin:appointments_medicaltestschedule_changelist')
         else:
             form = CSVUploadForm()
@@ -112,3 +175,39 @@ class MedicalTestScheduleAdmin(admin.ModelAdmin):
             'form': form,
         }
         return render(request, 'admin/appointments/upload_csv.html', ctx)
+
+    def export(self, request):
+        """
+        Download the timetable (or one ward / day range / department of
+        it) as a streamed roster.
+        """
+        form = ExportForm(request.GET or None)
+        if form.is_bound and form.is_valid():
+            data = form.cleaned_data
+            queryset = exports.schedule_queryset(
+                data['date_from'], data['date_to'], data['ward'], data['department'],
+            )
+            return exports.export_response(
+                request, queryset, data['format'], f"medical-tests-{timezone.localdate():%Y%m%d}",
+            )
+
+        ctx = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'form': form,
+        }
+        return render(request, 'admin/appointments/export.html', ctx)
+
+    def import_progress(self, request):
+        """
+        JSON status of unfinished imports plus those finished in the last
+        hour, polled by the changelist template.
+        """
+        jobs = ImportJob.objects.filter(status__in=('queued', 'running'))
+        recent = ImportJob.objects.filter(
+            status__in=('done', 'failed'),
+            finished_at__gte=timezone.now() - timedelta(hours=1),
+        )
+        fields = ('id', 'status', 'dry_run', 'rows_processed', 'report', 'error')
+        rows = list(jobs.values(*fields)) + list(recent.values(*fields))
+        return JsonResponse({'jobs': rows})
@@ -0,0 +1,137 @@
+# appointments/api.py
+"""
+Read-only JSON API (versioned in the URL: /api/v1/...).
+
+Lists are keyset-paginated with the same cursors as the dashboards and
+accept ?fields= for sparse responses. List responses are cached per user
+under their change counter (appointments.versions), so a repeat request
+is one cache read until something in that user's lists changes.
+"""
+
+import hashlib
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.shortcuts import get_object_or_404
+from django.urls import path
+from rest_framework import generics
+from rest_framework.authtoken.views import obtain_auth_token
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import availability, versions
+from .models import Appointment, MedicalTestSchedule
+from .pagination import PAGE_SIZE, keyset_page
+from .profiles import get_role
+from .serializers import AppointmentSerializer, MedicalTestSerializer, SlotSerializer
+
+API_CACHE_TIMEOUT = 10 * 60
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF adapter for pagination.keyset_page; the view's `ordering` must end
+    in a unique field.
+    """
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = request.query_params.get('size', '')
+        size = min(int(size), MAX_PAGE_SIZE) if size.isdigit() and int(size) else PAGE_SIZE
+        try:
+            self.page = keyset_page(queryset, view.ordering, request.query_params.get('cursor'), size)
+        except (ValueError, ValidationError):
+            raise ParseError("invalid cursor")
+        return self.page.rows
+
+    def get_next_link(self):
+        if self.page.next is None:
+            return None
+        params = self.request.query_params.copy()
+        params['cursor'] = self.page.next
+        return self.request.build_absolute_uri(f"{self.request.path}?{urlencode(params)}")
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+
+class CachedListAPIView(generics.ListAPIView):
+    """
+    A list whose JSON is cached per user and full path, keyed on the
+    user's change counter rather than expired by hand.
+    """
+    pagination_class = KeysetPagination
+
+    def list(self, request, *args, **kwargs):
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = f"api:{request.user.pk}:{versions.user_version(request.user.pk)}:{path}"
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, API_CACHE_TIMEOUT)
+        return Response(data)
+
+
+class AppointmentList(CachedListAPIView):
+    """
+    The user's clinic appointments (as student, or as staff), newest
+    first; ?status= filters.
+    """
+    serializer_class = AppointmentSerializer
+    ordering = ('-date_time', '-id')
+
+    def get_queryset(self):
+        user = self.request.user
+        if get_role(user) == 'staff':
+            queryset = Appointment.objects.filter(staff=user)
+        else:
+            queryset = Appointment.objects.filter(student=user)
+        status = self.request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset.select_related('student', 'staff')
+
+
+class MedicalTestList(CachedListAPIView):
+    """
+    A student's medical-test slot, or the slots a staff member runs.
+    """
+    serializer_class = MedicalTestSerializer
+    ordering = ('scheduled_date', 'scheduled_time', 'id')
+
+    def get_queryset(self):
+        user = self.request.user
+        if get_role(user) == 'staff':
+            queryset = MedicalTestSchedule.objects.filter(staff=user)
+        else:
+            queryset = MedicalTestSchedule.objects.filter(student__user=user)
+        return queryset.select_related('student__user', 'staff')
+
+
+class StaffAvailability(APIView):
+    """
+    The next free slots of one staff member (?n=, at most 50). Served
+    from the availability index, which is already cached.
+    """
+    def get(self, request, staff_id, version=None):
+        n = request.query_params.get('n', '10')
+        if not n.isdigit():
+            raise ParseError("n must be an integer")
+        staff = get_object_or_404(get_user_model(), pk=staff_id, profile__role='staff')
+        slots = availability.next_free_slots(staff.pk, min(int(n), 50))
+        data = SlotSerializer(
+            [{'start': slot, 'label': availability.label_slot(slot)} for slot in slots], many=True
+        ).data
+        return Response({'staff': staff.pk, 'slots': data})
+
+
+urlpatterns = [
+    path('auth-token/', obtain_auth_token, name='api_auth_token'),
+    path('appointments/', AppointmentList.as_view(), name='api_appointments'),
+    path('medical-tests/', MedicalTestList.as_view(), name='api_medical_tests'),
+    path('staff/<int:staff_id>/availability/', StaffAvailability.as_view(), name='api_staff_availability'),
+]
@@ -5,4 +5,6 @@ class AppointmentsConfig(AppConfig):
     name = 'appointments'
 
     def ready(self):
+        import appointments.database
+        import appointments.instrumentation
         import appointments.signals
@@ -0,0 +1,179 @@
+# appointments/audit.py
+"""
+Audit trail writes. Code calls record(); the sink named by the AUDIT_SINK
+setting decides when the AuditLog row reaches the database.
+
+BufferedSink (the default) keeps entries in a per-process buffer once the
+surrounding transaction commits and writes them with one bulk_create when
+AUDIT_BUFFER_SIZE entries are waiting or the oldest is AUDIT_FLUSH_INTERVAL
+seconds old (a timer enforces this even in an idle process), at the end of
+a request, or at exit. If the bulk insert fails the entries are retried one
+at a time, so only the bad ones are lost. A hard crash can lose up to
+AUDIT_FLUSH_INTERVAL seconds of entries; InlineSink writes every entry
+straight away.
+"""
+
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class InlineSink:
+    """
+    One INSERT per entry, inside the caller's transaction.
+    """
+    def record(self, entry):
+        entry.save()
+
+    def record_many(self, entries):
+        AuditLog.objects.bulk_create(entries)
+
+    def flush(self):
+        pass
+
+    def flush_if_due(self):
+        pass
+
+
+class BufferedSink:
+    """
+    Write-behind buffer flushed with bulk_create on size or age.
+    """
+    def __init__(self, max_entries=None, max_age=None):
+        self.max_entries = max_entries or getattr(settings, 'AUDIT_BUFFER_SIZE', 100)
+        self.max_age = max_age or getattr(settings, 'AUDIT_FLUSH_INTERVAL', 5.0)
+        self._lock = threading.Lock()
+        self._entries = []
+        self._oldest = None
+
+    def record(self, entry):
+        self.record_many([entry])
+
+    def record_many(self, entries):
+        # entries from a rolled-back transaction are never buffered
+        transaction.on_commit(lambda: self._append(entries))
+
+    def _append(self, entries):
+        with self._lock:
+            self._entries.extend(entries)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+                self._start_timer()
+        self.flush_if_due()
+
+    def _start_timer(self):
+        # the age limit must hold even if no other entry or request comes
+        timer = threading.Timer(self.max_age, self._flush_from_timer)
+        timer.daemon = True
+        timer.start()
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # this thread's connections only; it won't run queries again
+            connections.close_all()
+
+    def _due(self):
+        return self._entries and (
+            len(self._entries) >= self.max_entries
+            or time.monotonic() - self._oldest >= self.max_age
+        )
+
+    def flush_if_due(self):
+        if self._due():
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries, self._oldest = self._entries, [], None
+        if not entries:
+            return
+        try:
+            with transaction.atomic():
+                AuditLog.objects.bulk_create(entries)
+        except Exception:
+            logger.warning("Bulk insert of %d audit entries failed, retrying one by one",
+                           len(entries), exc_info=True)
+            self._insert_each(entries)
+
+    def _insert_each(self, entries):
+        # one bad row (e.g. its user was deleted meanwhile) costs only itself
+        for entry in entries:
+            entry.pk = None
+            try:
+                with transaction.atomic():
+                    entry.save(force_insert=True)
+            except Exception:
+                logger.exception("Dropped audit entry %r", entry.action)
+
+
+_sink = None
+
+
+def get_sink():
+    global _sink
+    if _sink is None:
+        _sink = import_string(getattr(settings, 'AUDIT_SINK', 'appointments.audit.BufferedSink'))()
+    return _sink
+
+
+def _entry(user, kind, appointment_id, details, timestamp):
+    label = dict(AuditLog.KIND_CHOICES)[kind]
+    return AuditLog(
+        user=user,
+        action=f"{label} appointment {appointment_id}" if appointment_id else label,
+        kind=kind,
+        appointment_id=appointment_id,
+        details=details,
+        timestamp=timestamp,
+    )
+
+
+def record(user, kind, appointment_id=None, details=None):
+    """
+    Log an AuditLog.KIND_CHOICES event by `user`, optionally about one
+    appointment. The timestamp is taken now, not at flush time.
+    """
+    get_sink().record(_entry(user, kind, appointment_id, details, timezone.now()))
+
+
+def record_many(kind, events, inline=False):
+    """
+    Log the same kind of event for many appointments at once; `events` is
+    an iterable of (user, appointment_id, details). Written with a single
+    bulk_create whichever sink is configured. With `inline`, that happens
+    inside the caller's transaction even when entries are buffered, so
+    the change and its audit rows commit together.
+    """
+    now = timezone.now()
+    sink = InlineSink() if inline else get_sink()
+    sink.record_many([
+        _entry(user, kind, appointment_id, details, now) for user, appointment_id, details in events
+    ])
+
+
+def flush():
+    if _sink is not None:
+        _sink.flush()
+
+
+@receiver(request_finished)
+def _flush_after_request(sender, **kwargs):
+    if _sink is not None:
+        _sink.flush_if_due()
+
+
+atexit.register(flush)
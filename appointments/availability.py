@@ -0,0 +1,223 @@
+# appointments/availability.py
+"""
+Free-slot index for staff appointments.
+
+Every staff member works the same grid: SLOT_MINUTES slots from DAY_START
+to DAY_END on WORKING_DAYS. The taken slots of each (staff, day) are kept
+in the cache as a sorted list of timestamps, built with one query on a
+miss and patched in place by the Appointment signals, so checking a slot
+is a bisect rather than a query against the Appointment table.
+
+A staff member running a medical-test slot is busy too, so those slots
+go into the same index. They change in bulk (imports), so rather than
+being patched their days are dropped with forget_days() and rebuilt on
+the next lookup.
+"""
+
+import bisect
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.formats import date_format
+
+from .models import Appointment, MedicalTestSchedule
+
+SLOT_MINUTES   = 30
+DAY_START      = time(9, 0)
+DAY_END        = time(17, 0)
+WORKING_DAYS   = (0, 1, 2, 3, 4)    # Mon–Fri
+BOOKING_WINDOW = 60                 # days ahead that are offered
+INDEX_TIMEOUT  = 10 * 60            # seconds; bounds drift between processes
+
+SLOT_INPUT_FORMAT = '%Y-%m-%dT%H:%M'
+
+
+def _key(staff_id, day):
+    return f"availability:{staff_id}:{day.isoformat()}"
+
+
+def _local(dt):
+    return timezone.localtime(dt, timezone.get_default_timezone())
+
+
+def day_grid(day):
+    """
+    All bookable slots on `day` as aware datetimes, in order.
+    """
+    if day.weekday() not in WORKING_DAYS:
+        return []
+    tz   = timezone.get_default_timezone()
+    slot = timezone.make_aware(datetime.combine(day, DAY_START), tz)
+    end  = timezone.make_aware(datetime.combine(day, DAY_END), tz)
+    grid = []
+    while slot < end:
+        grid.append(slot)
+        slot += timedelta(minutes=SLOT_MINUTES)
+    return grid
+
+
+def is_on_grid(dt):
+    local = _local(dt)
+    minutes = (local.hour * 60 + local.minute) - (DAY_START.hour * 60 + DAY_START.minute)
+    return (
+        local.weekday() in WORKING_DAYS
+        and DAY_START <= local.time() < DAY_END
+        and minutes % SLOT_MINUTES == 0
+        and local.second == 0
+        and local.microsecond == 0
+    )
+
+
+def _taken_slots(staff_id, days):
+    """
+    {day: sorted timestamps of live appointments and medical-test slots}
+    for `days`, reading the cache and filling every miss with one range
+    query per table.
+    """
+    keys   = {_key(staff_id, day): day for day in days}
+    taken  = {keys[key]: slots for key, slots in cache.get_many(keys).items()}
+    missing = [day for day in days if day not in taken]
+    if missing:
+        tz    = timezone.get_default_timezone()
+        start = timezone.make_aware(datetime.combine(min(missing), time.min), tz)
+        end   = timezone.make_aware(datetime.combine(max(missing) + timedelta(days=1), time.min), tz)
+        fetched = {day: [] for day in missing}
+        rows = (Appointment.objects
+                .filter(staff_id=staff_id, date_time__gte=start, date_time__lt=end)
+                .exclude(status__in=Appointment.RELEASED_STATUSES)
+                .values_list('date_time', flat=True))
+        for dt in rows:
+            day = _local(dt).date()
+            if day in fetched:
+                bisect.insort(fetched[day], int(dt.timestamp()))
+        tests = (MedicalTestSchedule.objects
+                 .filter(staff_id=staff_id, scheduled_date__gte=min(missing),
+                         scheduled_date__lte=max(missing))
+                 .values_list('scheduled_date', 'scheduled_time'))
+        for day, at in tests:
+            ts = int(timezone.make_aware(datetime.combine(day, at), tz).timestamp())
+            if day in fetched and not _contains(fetched[day], ts):
+                bisect.insort(fetched[day], ts)
+        cache.set_many({_key(staff_id, day): slots for day, slots in fetched.items()}, INDEX_TIMEOUT)
+        taken.update(fetched)
+    return taken
+
+
+def _contains(slots, ts):
+    i = bisect.bisect_left(slots, ts)
+    return i < len(slots) and slots[i] == ts
+
+
+def is_slot_free(staff_id, dt):
+    day = _local(dt).date()
+    return not _contains(_taken_slots(staff_id, [day])[day], int(dt.timestamp()))
+
+
+def next_free_slots(staff_id, n=10, after=None):
+    """
+    The next `n` open slots for a staff member, soonest first, looking at
+    most BOOKING_WINDOW days ahead.
+    """
+    after = after or timezone.now()
+    first = _local(after).date()
+    days  = [first + timedelta(days=i) for i in range(BOOKING_WINDOW)]
+    days  = [day for day in days if day.weekday() in WORKING_DAYS]
+
+    free = []
+    # a working week per lookup, so the usual case is a single cache read
+    for i in range(0, len(days), len(WORKING_DAYS)):
+        batch = days[i:i + len(WORKING_DAYS)]
+        taken = _taken_slots(staff_id, batch)
+        for day in batch:
+            for slot in day_grid(day):
+                if slot > after and not _contains(taken[day], int(slot.timestamp())):
+                    free.append(slot)
+                    if len(free) == n:
+                        return free
+    return free
+
+
+def format_slot(slot):
+    return _local(slot).strftime(SLOT_INPUT_FORMAT)
+
+
+def label_slot(slot):
+    return date_format(_local(slot), 'D j M Y, H:i')
+
+
+def slot_choices(staff_id, n=10):
+    """
+    (value, label) pairs for the next `n` free slots, as used by the
+    booking form's slot picker.
+    """
+    return [(format_slot(slot), label_slot(slot)) for slot in next_free_slots(staff_id, n)]
+
+
+def _patch(staff_id, dt, live):
+    """
+    Mark one slot taken (live=True) or free in the cached index. Days that
+    aren't cached are left alone; they are built fresh on the next lookup.
+    """
+    key   = _key(staff_id, _local(dt).date())
+    slots = cache.get(key)
+    if slots is None:
+        return
+    ts = int(dt.timestamp())
+    i  = bisect.bisect_left(slots, ts)
+    present = i < len(slots) and slots[i] == ts
+    if live and not present:
+        slots.insert(i, ts)
+    elif not live and present:
+        del slots[i]
+    else:
+        return
+    cache.set(key, slots, INDEX_TIMEOUT)
+
+
+def mark_taken(staff_id, dt):
+    """
+    Record a slot the database reports as taken but the index missed.
+    """
+    _patch(staff_id, dt, live=True)
+
+
+def mark_released(staff_id, dts):
+    """
+    Free slots whose appointments were released by a bulk UPDATE, which
+    sends no signals. One cache read and write per affected day.
+    """
+    by_day = {}
+    for dt in dts:
+        by_day.setdefault(_key(staff_id, _local(dt).date()), set()).add(int(dt.timestamp()))
+    for key, released in by_day.items():
+        slots = cache.get(key)
+        if slots is None:
+            continue
+        kept = [ts for ts in slots if ts not in released]
+        if len(kept) != len(slots):
+            cache.set(key, kept, INDEX_TIMEOUT)
+
+
+def forget_days(staff_days):
+    """
+    Drop the cached index for each (staff_id, day) pair, e.g. after
+    medical-test slots were written there.
+    """
+    cache.delete_many([_key(staff_id, day) for staff_id, day in set(staff_days)])
+
+
+def appointment_saved(appt):
+    old_dt, old_status = getattr(appt, '_loaded_slot', (None, None))
+    was_live = old_dt is not None and old_status not in Appointment.RELEASED_STATUSES
+    is_live  = appt.status not in Appointment.RELEASED_STATUSES
+    if was_live and (old_dt != appt.date_time or not is_live):
+        _patch(appt.staff_id, old_dt, live=False)
+    if is_live:
+        _patch(appt.staff_id, appt.date_time, live=True)
+    appt._loaded_slot = (appt.date_time, appt.status)
+
+
+def appointment_deleted(appt):
+    if appt.status not in Appointment.RELEASED_STATUSES:
+        _patch(appt.staff_id, appt.date_time, live=False)
@@ -0,0 +1,166 @@
+# appointments/booking.py
+"""
+Booking service: reserves a staff slot with a single INSERT and lets the
+database's live-slot constraint decide races, instead of a check-then-save
+that two students can pass at the same time. Staff decide on pending
+requests in bulk with decide_appointments.
+"""
+
+import logging
+import secrets
+from collections import namedtuple
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from . import audit, availability, dashboards, versions
+from .models import Appointment
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+HOLD_SECONDS = 5 * 60
+
+# staff decisions on pending appointments: action -> new status
+DECISIONS = {'confirm': 'confirmed', 'reject': 'rejected'}
+MAX_BULK_DECISIONS = 500
+
+# busy: the database could not take the write in time (SQLite's lock)
+BookingResult = namedtuple('BookingResult', ['appointment', 'alternatives', 'busy'], defaults=[False])
+
+
+def _hold_key(staff_id, dt):
+    return f"slot-hold:{staff_id}:{int(dt.timestamp())}"
+
+
+def _user_hold_key(user_id):
+    # the one slot a user holds, so picking another releases it
+    return f"slot-hold-user:{user_id}"
+
+
+def release_hold(user):
+    """
+    Drop `user`'s current hold, if it is still theirs.
+    """
+    key = cache.get(_user_hold_key(user.pk))
+    if key is None:
+        return
+    _, holder_id = cache.get(key, (None, None))
+    if holder_id == user.pk:
+        cache.delete(key)
+    cache.delete(_user_hold_key(user.pk))
+
+
+def hold_slot(user, staff_id, dt):
+    """
+    Hold a slot for `user` for HOLD_SECONDS while they fill in the form.
+    A user holds one slot at a time: a new hold releases their previous
+    one. Returns the hold token, or None if someone else already holds it.
+    """
+    key = _hold_key(staff_id, dt)
+    held_token, holder_id = cache.get(key, (None, None))
+    if holder_id == user.pk:
+        # picking the same slot again just hands back the existing hold
+        return held_token
+    if holder_id is not None:
+        return None
+
+    release_hold(user)
+    token = secrets.token_urlsafe(16)
+    if not cache.add(key, (token, user.pk), HOLD_SECONDS):
+        return None
+    cache.set(_user_hold_key(user.pk), key, HOLD_SECONDS)
+    return token
+
+
+def _held_by_other(user, staff_id, dt, hold_token):
+    token, holder_id = cache.get(_hold_key(staff_id, dt), (None, None))
+    return token is not None and not (holder_id == user.pk and token == hold_token)
+
+
+def book_slot(student, staff, date_time, reason_for_visit='', hold_token=None):
+    """
+    Try to book `date_time` with `staff` for `student`.
+
+    Returns a BookingResult: on success `appointment` is the new pending
+    Appointment; if the slot is held by someone else or was booked first,
+    `appointment` is None and `alternatives` lists the next free slots.
+    If the database stayed locked past its busy timeout, `busy` is set
+    and the slot may well still be free.
+    """
+    if not _held_by_other(student, staff.pk, date_time, hold_token):
+        try:
+            with transaction.atomic():
+                appt = Appointment.objects.create(
+                    student=student,
+                    staff=staff,
+                    date_time=date_time,
+                    reason_for_visit=reason_for_visit,
+                    status='pending',
+                )
+                audit.record(
+                    user=student,
+                    kind='booked',
+                    appointment_id=appt.id,
+                    details={
+                        'staff': staff.username,
+                        'date_time': str(appt.date_time)
+                    }
+                )
+        except IntegrityError:
+            # lost the race; make sure the index stops offering this slot
+            availability.mark_taken(staff.pk, date_time)
+        except OperationalError:
+            logger.warning("Booking for staff %s at %s failed: database busy",
+                           staff.pk, date_time, exc_info=True)
+            return BookingResult(None, [], busy=True)
+        else:
+            release_hold(student)
+            return BookingResult(appt, [])
+
+    return BookingResult(None, availability.next_free_slots(staff.pk, 5, after=date_time))
+
+
+def decide_appointments(staff, ids, action):
+    """
+    Apply a DECISIONS `action` to those of `ids` that are `staff`'s own
+    pending appointments, in one transaction: a locking SELECT of the
+    appointments, one for the students' usernames (kept out of the locked
+    query so no auth_user rows are locked), one UPDATE and one audit bulk
+    insert. Returns how many appointments changed.
+
+    A queryset update sends no signals, so the slot index, staff counts
+    and API versions that the Appointment signals maintain are updated
+    here once the transaction commits.
+    """
+    status = DECISIONS[action]
+    with transaction.atomic():
+        rows = list(
+            Appointment.objects.select_for_update()
+            .filter(id__in=ids, staff=staff, status='pending')
+            .values_list('id', 'student_id', 'date_time')
+        )
+        if not rows:
+            return 0
+        usernames = dict(
+            User.objects.filter(pk__in={student_id for _, student_id, _ in rows})
+            .values_list('pk', 'username')
+        )
+        Appointment.objects.filter(
+            id__in=[pk for pk, _, _ in rows], staff=staff, status='pending'
+        ).update(status=status, updated_at=timezone.now())
+        audit.record_many(status, [
+            (staff, pk, {'student': usernames[student_id], 'date_time': str(date_time)})
+            for pk, student_id, date_time in rows
+        ])
+
+        def after_commit():
+            if status in Appointment.RELEASED_STATUSES:
+                availability.mark_released(staff.pk, [date_time for _, _, date_time in rows])
+            dashboards.invalidate_staff_counts(staff.pk)
+        transaction.on_commit(after_commit)
+        versions.bump(staff.pk, *{student_id for _, student_id, _ in rows})
+    return len(rows)
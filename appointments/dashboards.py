@@ -0,0 +1,170 @@
+# appointments/dashboards.py
+"""
+Read models for the dashboards: each one loads everything its template
+renders in a fixed number of queries, whatever the number of rows. Lists
+are cursor-paginated; later pages come from the `load_more` view. The
+a-prefixed functions are the same read models on the async ORM.
+
+query_plans() EXPLAINs every dashboard query, so the tests (and the
+explain_dashboards command, on real data) can check none of them scans
+a whole table.
+"""
+
+import re
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Appointment, AuditLog, MedicalTestSchedule
+from .pagination import akeyset_page, keyset_page
+
+COUNTS_TIMEOUT = 10 * 60
+
+# plan lines that mean a full scan of one of our tables
+TABLE_SCAN = re.compile(
+    r'(?:^|\W)SCAN (?:TABLE )?appointments_\w+\b(?! USING)'  # SQLite
+    r'|Seq Scan on appointments_\w+'                         # PostgreSQL
+)
+
+# role:      who may page through the list
+# ordering:  keyset ordering, ending in a unique field
+# template:  renders the <tr> rows of one page
+# queryset:  user -> that user's rows, with everything the template uses joined in
+DashboardList = namedtuple('DashboardList', ['role', 'ordering', 'template', 'queryset'])
+
+LISTS = {
+    # a student's regular clinic appointments
+    'appointments': DashboardList(
+        'student', ('-date_time', '-id'), 'appointments/rows/student_appointments.html',
+        lambda user: Appointment.objects.filter(student=user).select_related('staff'),
+    ),
+    # a student's assigned medical-test slots
+    'medical_tests': DashboardList(
+        'student', ('scheduled_date', 'scheduled_time', 'id'), 'appointments/rows/medical_tests.html',
+        lambda user: MedicalTestSchedule.objects.filter(student__user=user).select_related('staff'),
+    ),
+    # pending clinic appointments for a staff member
+    'pending': DashboardList(
+        'staff', ('date_time', 'id'), 'appointments/rows/pending_appointments.html',
+        lambda user: Appointment.objects.filter(
+            staff=user, status='pending'
+        ).select_related('student'),
+    ),
+    # confirmed upcoming appointments
+    'confirmed': DashboardList(
+        'staff', ('date_time', 'id'), 'appointments/rows/confirmed_appointments.html',
+        lambda user: Appointment.objects.filter(
+            staff=user, status='confirmed', date_time__gte=timezone.now()
+        ).select_related('student'),
+    ),
+    # this staff’s medical-test slots
+    'test_slots': DashboardList(
+        'staff', ('scheduled_date', 'scheduled_time', 'id'), 'appointments/rows/test_slots.html',
+        lambda user: MedicalTestSchedule.objects.filter(
+            staff=user
+        ).select_related('student__user'),
+    ),
+}
+
+
+def page(list_name, user, cursor=None):
+    """
+    One page of a dashboard list for `user`. Raises ValueError on a bad
+    cursor.
+    """
+    spec = LISTS[list_name]
+    return keyset_page(spec.queryset(user), spec.ordering, cursor)
+
+
+async def apage(list_name, user, cursor=None):
+    spec = LISTS[list_name]
+    return await akeyset_page(spec.queryset(user), spec.ordering, cursor)
+
+
+def query_plans(staff, student):
+    """
+    (name, plan) for each dashboard query, run as `staff` or `student`.
+    """
+    for name, spec in LISTS.items():
+        user = staff if spec.role == 'staff' else student
+        yield f"list:{name}", spec.queryset(user).order_by(*spec.ordering)[:26].explain()
+    yield 'staff_counts', Appointment.objects.filter(staff=staff, status='pending').explain()
+    yield 'audit:user', AuditLog.objects.filter(user=student).order_by('-timestamp')[:25].explain()
+
+
+def _counts_key(staff_id):
+    return f"staff-counts:{staff_id}"
+
+
+def _counts_aggregates():
+    return {
+        'pending':   Count('id', filter=Q(status='pending')),
+        'confirmed': Count('id', filter=Q(status='confirmed', date_time__gte=timezone.now())),
+    }
+
+
+def staff_counts(staff_id):
+    """
+    {'pending': n, 'confirmed': n} for a staff member, from the cache or
+    one aggregate query. Appointment saves drop the cached value.
+    """
+    key = _counts_key(staff_id)
+    counts = cache.get(key)
+    if counts is None:
+        counts = Appointment.objects.filter(staff_id=staff_id).aggregate(**_counts_aggregates())
+        cache.set(key, counts, COUNTS_TIMEOUT)
+    return counts
+
+
+async def astaff_counts(staff_id):
+    key = _counts_key(staff_id)
+    counts = await cache.aget(key)
+    if counts is None:
+        counts = await Appointment.objects.filter(staff_id=staff_id).aaggregate(**_counts_aggregates())
+        await cache.aset(key, counts, COUNTS_TIMEOUT)
+    return counts
+
+
+def invalidate_staff_counts(staff_id):
+    cache.delete(_counts_key(staff_id))
+
+
+def student_dashboard(student):
+    """
+    Context for dashboard_student.html: first page of each list.
+    """
+    return {
+        'appointments':  page('appointments', student),
+        'medical_tests': page('medical_tests', student),
+    }
+
+
+def staff_dashboard(staff):
+    """
+    Context for dashboard_staff.html: first page of each list, plus the
+    cached counts.
+    """
+    return {
+        'pending_appointments':   page('pending', staff),
+        'confirmed_appointments': page('confirmed', staff),
+        'test_slots':             page('test_slots', staff),
+        'counts':                 staff_counts(staff.pk),
+    }
+
+
+async def astudent_dashboard(student):
+    return {
+        'appointments':  await apage('appointments', student),
+        'medical_tests': await apage('medical_tests', student),
+    }
+
+
+async def astaff_dashboard(staff):
+    return {
+        'pending_appointments':   await apage('pending', staff),
+        'confirmed_appointments': await apage('confirmed', staff),
+        'test_slots':             await apage('test_slots', staff),
+        'counts':                 await astaff_counts(staff.pk),
+    }
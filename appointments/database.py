@@ -0,0 +1,45 @@
+# appointments/database.py
+"""
+Per-connection database tuning. Every new SQLite connection gets the
+PRAGMAs in settings.SQLITE_PRAGMAS, most importantly WAL journaling so
+that readers never wait for a writer and concurrent bookings only queue
+on the write lock instead of failing with "database is locked".
+PostgreSQL needs nothing here: pooling and health checks are plain
+settings (CONN_MAX_AGE, CONN_HEALTH_CHECKS).
+
+lock_timetable() serialises writers of the medical-test timetable for
+the rest of the current transaction, on either backend.
+"""
+
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+TIMETABLE_LOCK_ID = 0x636c6e63  # pg advisory lock key, any fixed bigint
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def lock_timetable():
+    """
+    Block until no other transaction holds the timetable lock, then hold
+    it until this one ends. Must run inside transaction.atomic(), and on
+    SQLite before anything else in it, so later reads see the latest
+    commit.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [TIMETABLE_LOCK_ID])
+        else:
+            # SQLite has a single writer: a write that matches no rows
+            # still takes the database's write lock (waiting busy_timeout)
+            table = connection.ops.quote_name('appointments_medicaltestschedule')
+            cursor.execute(f"UPDATE {table} SET id = id WHERE 0")
@@ -1,10 +1,56 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
 from django.core.exceptions import PermissionDenied
 
+from .profiles import aget_role, get_role
+
 def role_required(required_role):
     def decorator(view_func):
+        @wraps(view_func)
         def _wrapped_view(request, *args, **kwargs):
-            if request.user.is_authenticated and request.user.profile.role == required_role:
+            # the role comes from the cache, not a Profile query
+            if request.user.is_authenticated and get_role(request.user) == required_role:
                 return view_func(request, *args, **kwargs)
             raise PermissionDenied
         return _wrapped_view
     return decorator
+
+
+async def _auser(request):
+    # request.user is lazy and loading it queries the session and user
+    # tables, so resolve it in a thread; afterwards it is a plain object
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+def async_login_required(view_func):
+    """
+    login_required for `async def` views.
+    """
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        user = await _auser(request)
+        if user.is_authenticated:
+            return await view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+    return _wrapped_view
+
+
+def async_role_required(required_role):
+    """
+    role_required for `async def` views; implies async_login_required.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def _wrapped_view(request, *args, **kwargs):
+            user = await _auser(request)
+            if not user.is_authenticated:
+                return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+            if await aget_role(user) == required_role:
+                return await view_func(request, *args, **kwargs)
+            raise PermissionDenied
+        return _wrapped_view
+    return decorator
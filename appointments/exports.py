@@ -0,0 +1,122 @@
+# appointments/exports.py
+"""
+Streamed exports of the medical-test timetable, for ward rosters.
+
+Rows are read with .iterator() (a server-side cursor on PostgreSQL) and
+with select_related, so an export is one query and holds at most one
+chunk of rows in memory however large the timetable is. CSV is written
+as it is read. XLSX needs openpyxl; its write-only workbook spools to a
+temporary file, which is then streamed.
+"""
+
+import csv
+import io
+import tempfile
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .models import MedicalTestSchedule
+
+try:
+    import openpyxl
+except ImportError:  # XLSX exports are simply not offered
+    openpyxl = None
+
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per round trip
+FLUSH_ROWS        = 500   # CSV rows per chunk sent to the client
+ASYNC_BATCH       = 20    # chunks pulled per thread hop under ASGI
+
+HEADER = ['Date', 'Time', 'Ward', 'Matric No', 'Student', 'Username', 'Department', 'Staff']
+
+CONTENT_TYPES = {
+    'csv':  'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def formats():
+    return ['csv', 'xlsx'] if openpyxl is not None else ['csv']
+
+
+def schedule_queryset(date_from=None, date_to=None, ward=None, department=None):
+    """
+    Test slots in roster order (day, ward, time), optionally filtered.
+    """
+    queryset = MedicalTestSchedule.objects.select_related('student__user', 'staff')
+    if date_from:
+        queryset = queryset.filter(scheduled_date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(scheduled_date__lte=date_to)
+    if ward:
+        queryset = queryset.filter(ward_number=ward)
+    if department:
+        queryset = queryset.filter(student__department=department)
+    return queryset.order_by('scheduled_date', 'ward_number', 'scheduled_time', 'id')
+
+
+def roster_rows(queryset):
+    """
+    The header, then one list of cells per slot.
+    """
+    yield HEADER
+    for slot in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        student = slot.student
+        user    = student.user if student else None
+        yield [
+            slot.scheduled_date.isoformat(),
+            slot.scheduled_time.strftime('%H:%M'),
+            slot.ward_number,
+            student.matric_no if student else '',
+            (user.get_full_name() or user.username) if user else '',
+            user.username if user else '',
+            student.department if student else '',
+            slot.staff.get_full_name() or slot.staff.username,
+        ]
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for batch in iter(lambda: list(islice(rows, FLUSH_ROWS)), []):
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def xlsx_chunks(rows, chunk_bytes=64 * 1024):
+    if openpyxl is None:
+        raise ValueError("XLSX exports need the openpyxl package")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Medical tests')
+    for row in rows:
+        sheet.append(row)
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        yield from iter(lambda: spool.read(chunk_bytes), b'')
+
+
+async def _batched(chunks):
+    # pull several chunks per sync_to_async call; the generator keeps
+    # running in the request's one sync thread, which owns its cursor
+    next_batch = sync_to_async(lambda: list(islice(chunks, ASYNC_BATCH)))
+    while batch := await next_batch():
+        for chunk in batch:
+            yield chunk
+
+
+def export_response(request, queryset, fmt, filename):
+    """
+    A StreamingHttpResponse of the queryset's rows as `fmt` (csv / xlsx).
+    """
+    chunks = xlsx_chunks(roster_rows(queryset)) if fmt == 'xlsx' else csv_chunks(roster_rows(queryset))
+    if isinstance(request, ASGIRequest):
+        # under ASGI a sync iterator would be read into memory whole
+        chunks = _batched(chunks)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
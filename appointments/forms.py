@@ -3,8 +3,10 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import get_user_model
+from django.urls import reverse_lazy
 from django.utils import timezone
 
+from . import availability, profiles, usernames
 from .models import Profile, Appointment
 
 User = get_user_model()
@@ -27,29 +29,42 @@ class StudentSignUpForm(forms.Form):
 
     def save(self, commit=True):
         full_name = self.cleaned_data["full_name"].strip()
-        # use first word of the full name (lowercased) as the username
-        username = full_name.split()[0].lower()
+        # the username is the first word of the full name, plus a number
+        # if that is taken; see appointments.usernames
+        first_name = full_name.split()[0]
 
-        user = User(username=username, first_name=full_name)
+        user = User(username=usernames.normalize(first_name), first_name=full_name)
         user.set_password(self.cleaned_data["password1"])
 
         if commit:
-            user.save()
-            Profile.objects.create(
-                user=user,
+            usernames.save_with_unique_username(user, first_name, lambda u: profiles.create_user(
+                u,
                 role="student",
                 matric_no=self.cleaned_data["matric_no"],
                 department=self.cleaned_data["department"],
                 phone_number=self.cleaned_data.get("phone_number", ""),
-            )
+            ))
         return user
 
 
+class FreeSlotSelect(forms.Select):
+    """
+    A <select> of a staff member's next free slots. The options are
+    refilled from the free-slots endpoint whenever the staff field changes.
+    """
+    def __init__(self, attrs=None):
+        attrs = {'data-slots-url': reverse_lazy('appointments:free_slots'), **(attrs or {})}
+        super().__init__(attrs, choices=[('', 'Choose a staff member first')])
+
+
 class BookAppointmentForm(forms.ModelForm):
     date_time = forms.DateTimeField(
-        widget=forms.DateTimeInput(attrs={'type': 'datetime-local'}),
+        widget=FreeSlotSelect,
+        input_formats=[availability.SLOT_INPUT_FORMAT],
         label="Appointment Date & Time"
     )
+    # set by the slot picker when the student's hold on a slot succeeds
+    hold_token = forms.CharField(required=False, widget=forms.HiddenInput)
 
     class Meta:
         model = Appointment
@@ -60,6 +75,11 @@ class BookAppointmentForm(forms.ModelForm):
         # only staff users
         self.fields['staff'].queryset = User.objects.filter(profile__role='staff')
 
+        # when re-rendering a submitted form, offer that staff member's slots
+        staff_id = self['staff'].value()
+        if staff_id and str(staff_id).isdigit():
+            self.fields['date_time'].widget.choices = availability.slot_choices(int(staff_id))
+
     def clean_date_time(self):
         dt = self.cleaned_data['date_time']
         if dt < timezone.now():
@@ -71,6 +91,8 @@ class BookAppointmentForm(forms.ModelForm):
         staff = cleaned.get('staff')
         dt    = cleaned.get('date_time')
         if staff and dt:
-            if Appointment.objects.filter(staff=staff, date_time=dt).exists():
+            if not availability.is_on_grid(dt):
+                raise forms.ValidationError("Please pick one of the offered time slots.")
+            if not availability.is_slot_free(staff.pk, dt):
                 raise forms.ValidationError("Selected staff is not available at this date and time.")
         return cleaned
@@ -0,0 +1,161 @@
+# appointments/ical.py
+"""
+Per-user iCalendar feed of clinic appointments and medical-test slots.
+
+Feeds are fetched by calendar clients without a session, so the URL
+carries a signed token naming the user. Each feed has a strong ETag
+built from the latest change to the user's rows; a client polling with
+If-None-Match gets a 304 after two small aggregate queries instead of a
+full render.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .availability import SLOT_MINUTES
+from .models import Appointment, MedicalTestSchedule
+from .profiles import get_role
+from .scheduling import SLOT_LENGTH
+
+User = get_user_model()
+
+# appointments further back than this are left out of the feed
+FEED_HISTORY_DAYS = 90
+
+# bump to change every ETag when the feed format changes
+FEED_VERSION = 1
+
+_TOKEN_SALT = 'appointments.ical'
+
+_APPOINTMENT_STATUS = {
+    'pending':   'TENTATIVE',
+    'rejected':  'CANCELLED',
+    'cancelled': 'CANCELLED',
+}
+
+
+def feed_token(user):
+    return signing.dumps(user.pk, salt=_TOKEN_SALT)
+
+
+def user_for_token(token):
+    """
+    The user a feed token was issued to, or None if it is forged or the
+    user no longer exists.
+    """
+    try:
+        pk = signing.loads(token, salt=_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=pk, is_active=True).first()
+
+
+def _querysets(user):
+    since = timezone.now() - timedelta(days=FEED_HISTORY_DAYS)
+    if get_role(user) == 'staff':
+        appointments = Appointment.objects.filter(staff=user)
+        tests = MedicalTestSchedule.objects.filter(staff=user)
+    else:
+        appointments = Appointment.objects.filter(student=user)
+        tests = MedicalTestSchedule.objects.filter(student__user=user)
+    return appointments.filter(date_time__gte=since), tests
+
+
+def feed_etag(user):
+    """
+    Changes whenever a row in the user's feed is added, edited or removed
+    (the counts catch deletions, which don't move the MAX), and once a day
+    as old appointments leave the history window.
+    """
+    appointments, tests = _querysets(user)
+    a = appointments.aggregate(changed=Max('updated_at'), n=Count('id'))
+    t = tests.aggregate(changed=Max('updated_at'), n=Count('id'))
+    state = (FEED_VERSION, user.pk, timezone.localdate(),
+             a['changed'], a['n'], t['changed'], t['n'])
+    return hashlib.sha256(repr(state).encode()).hexdigest()[:32]
+
+
+def _escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    # RFC 5545: lines longer than 75 octets continue after CRLF + space
+    data = line.encode()
+    if len(data) <= 75:
+        return line
+    parts = []
+    while data:
+        cut = 75 if not parts else 74
+        # don't split a multi-byte character
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode())
+        data = data[cut:]
+    return '\r\n '.join(parts)
+
+
+def _utc(dt):
+    return dt.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _event(uid, start, end, summary, description='', status='CONFIRMED', stamp=None):
+    return [
+        'BEGIN:VEVENT',
+        f'UID:{uid}',
+        f'DTSTAMP:{_utc(stamp or timezone.now())}',
+        f'DTSTART:{_utc(start)}',
+        f'DTEND:{_utc(end)}',
+        f'SUMMARY:{_escape(summary)}',
+        f'DESCRIPTION:{_escape(description)}',
+        f'STATUS:{status}',
+        'END:VEVENT',
+    ]
+
+
+def render_feed(user, host='clinic-scheduler'):
+    appointments, tests = _querysets(user)
+    staff_view = get_role(user) == 'staff'
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//clinic_scheduler//appointments//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escape("Clinic schedule for " + user.get_username())}',
+    ]
+
+    for appt in appointments.select_related('student', 'staff').iterator():
+        other = appt.student if staff_view else appt.staff
+        lines += _event(
+            f'appointment-{appt.pk}@{host}',
+            appt.date_time,
+            appt.date_time + timedelta(minutes=SLOT_MINUTES),
+            f'Clinic appointment with {other.get_full_name() or other.get_username()}',
+            appt.reason_for_visit,
+            _APPOINTMENT_STATUS.get(appt.status, 'CONFIRMED'),
+            appt.updated_at,
+        )
+
+    for test in tests.select_related('student__user', 'staff').iterator():
+        start = timezone.make_aware(datetime.combine(test.scheduled_date, test.scheduled_time))
+        if staff_view and test.student:
+            summary = f'Medical test: {test.student.matric_no or test.student.user.get_username()}'
+        else:
+            summary = 'Medical test'
+        lines += _event(
+            f'medical-test-{test.pk}@{host}',
+            start,
+            start + SLOT_LENGTH,
+            summary,
+            f'Ward {test.ward_number}',
+            stamp=test.updated_at,
+        )
+
+    lines.append('END:VCALENDAR')
+    return ''.join(_fold(line) + '\r\n' for line in lines)
@@ -0,0 +1,250 @@
+# appointments/instrumentation.py
+"""
+In-process performance statistics, collected by PerformanceMiddleware
+without DEBUG. For a sample of requests (PERF_SAMPLE_RATE) it records
+total time, query count, SQL time and template render time per view name
+into ring buffers of the last PERF_BUFFER_SIZE requests, and keeps the
+PERF_SLOW_QUERIES slowest statements seen per view.
+
+Other layers can add plain counters with registry.incr() (the page cache
+reports its hits and misses this way).
+
+Queries are counted by a wrapper installed on every database connection
+as it is opened (install_wrapper), which reports to the request found in
+a context variable. Under ASGI the views' queries run in sync_to_async
+threads with their own connections, and the context variable follows
+them there.
+
+Stats live in each process's memory: with several workers, each one
+reports its own share of the traffic.
+"""
+
+import contextvars
+import heapq
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+# stats of the request being handled in this context, or None
+_current = contextvars.ContextVar('appointments_perf_request', default=None)
+
+SQL_PREVIEW_CHARS = 300
+
+
+def sample_rate():
+    return getattr(settings, 'PERF_SAMPLE_RATE', 1.0)
+
+
+class RequestStats:
+    """
+    What one request spent, filled in by the SQL wrapper and the timed
+    template backend while it runs.
+    """
+    def __init__(self, sampled):
+        self.sampled = sampled
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.slow = []  # (seconds, sql) of this request's slowest queries
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        if not self.sampled:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sql_time += elapsed
+            _keep_slowest(self.slow, (elapsed, sql[:SQL_PREVIEW_CHARS]))
+
+
+def _keep_slowest(heap, item):
+    limit = getattr(settings, 'PERF_SLOW_QUERIES', 5)
+    if len(heap) < limit:
+        heapq.heappush(heap, item)
+    elif item > heap[0]:
+        heapq.heapreplace(heap, item)
+
+
+def start_request(sampled):
+    stats = RequestStats(sampled)
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_wrapper(sender, connection, **kwargs):
+    # connection_created fires again on every reconnect of the same
+    # wrapper object, so only add ours once
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+class ViewStats:
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)  # (duration, queries, sql, template, status)
+        self.slow = []
+        self.count = 0
+        self.duration_sum = 0.0
+
+
+class Registry:
+    """
+    Per-view ring buffers, shared by every thread of the process.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._counters = Counter()
+
+    def incr(self, name, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += 1
+
+    def counters(self):
+        """
+        [(name, {label: value}, count)], sorted by name and labels.
+        """
+        with self._lock:
+            items = sorted(self._counters.items())
+        return [(name, dict(labels), count) for (name, labels), count in items]
+
+    def add(self, view, duration, stats, status):
+        size = getattr(settings, 'PERF_BUFFER_SIZE', 200)
+        with self._lock:
+            entry = self._views.get(view)
+            if entry is None:
+                entry = self._views[view] = ViewStats(size)
+            entry.samples.append((duration, stats.queries, stats.sql_time, stats.template_time, status))
+            entry.count += 1
+            entry.duration_sum += duration
+            for item in stats.slow:
+                _keep_slowest(entry.slow, item)
+
+    def snapshot(self):
+        """
+        {view: summary} computed from the buffers at this moment.
+        """
+        with self._lock:
+            views = {view: (list(e.samples), sorted(e.slow, reverse=True), e.count, e.duration_sum)
+                     for view, e in self._views.items()}
+        return {view: _summarize(*data) for view, data in sorted(views.items())}
+
+    def clear(self):
+        with self._lock:
+            self._views.clear()
+            self._counters.clear()
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def _summarize(samples, slow, count, duration_sum):
+    durations = [s[0] for s in samples]
+    return {
+        'count':          count,
+        'duration_sum':   duration_sum,
+        'window':         len(samples),
+        'duration_p50':   _quantile(durations, 0.5),
+        'duration_p99':   _quantile(durations, 0.99),
+        'queries_mean':   _mean([s[1] for s in samples]),
+        'queries_max':    max((s[1] for s in samples), default=0),
+        'sql_mean':       _mean([s[2] for s in samples]),
+        'template_mean':  _mean([s[3] for s in samples]),
+        'errors':         sum(1 for s in samples if s[4] >= 500),
+        'slowest_queries': [{'seconds': seconds, 'sql': sql} for seconds, sql in slow],
+    }
+
+
+registry = Registry()
+
+
+def prometheus_text(snapshot, counters=()):
+    """
+    Render a snapshot (and registry.counters()) in the Prometheus text
+    exposition format.
+    """
+    metrics = [
+        ('clinic_request_duration_seconds', 'summary', "Request time per view (sampled requests)."),
+        ('clinic_request_queries', 'gauge', "Mean SQL queries per request over the window."),
+        ('clinic_request_sql_seconds', 'gauge', "Mean SQL time per request over the window."),
+        ('clinic_request_template_seconds', 'gauge', "Mean template render time per request over the window."),
+    ]
+    lines = []
+    for name, kind, help_text in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for view, s in snapshot.items():
+            label = f'view="{_label(view)}"'
+            if name == 'clinic_request_duration_seconds':
+                lines.append(f'{name}{{{label},quantile="0.5"}} {s["duration_p50"]:.6f}')
+                lines.append(f'{name}{{{label},quantile="0.99"}} {s["duration_p99"]:.6f}')
+                lines.append(f'{name}_sum{{{label}}} {s["duration_sum"]:.6f}')
+                lines.append(f'{name}_count{{{label}}} {s["count"]}')
+            elif name == 'clinic_request_queries':
+                lines.append(f'{name}{{{label}}} {s["queries_mean"]:.2f}')
+            elif name == 'clinic_request_sql_seconds':
+                lines.append(f'{name}{{{label}}} {s["sql_mean"]:.6f}')
+            else:
+                lines.append(f'{name}{{{label}}} {s["template_mean"]:.6f}')
+
+    typed = set()
+    for name, labels, count in counters:
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        label = ','.join(f'{k}="{_label(str(v))}"' for k, v in labels.items())
+        lines.append(f'{name}{{{label}}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None or not stats.sampled:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """
+    The Django template backend, with top-level renders (includes are
+    part of their parent) timed into the current request's stats.
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from appointments.models import AuditLog
+
+FIELDS = ('id', 'user_id', 'action', 'kind', 'appointment_id', 'details', 'timestamp')
+
+
+def _month_start(year, month):
+    return timezone.make_aware(datetime(year, month, 1))
+
+
+def _add_months(dt, n):
+    index = dt.year * 12 + dt.month - 1 + n
+    return _month_start(index // 12, index % 12 + 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move whole months of AuditLog older than --keep-months into gzipped "
+        "JSONL files (one per month, auditlog-YYYY-MM.jsonl.gz) and delete "
+        "them from the table, so it only holds recent history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=6,
+                            help="Months kept in the table, counting the current one")
+        parser.add_argument('--output-dir', default=getattr(settings, 'AUDIT_ARCHIVE_DIR', 'archive'))
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report what would be archived")
+
+    def handle(self, *args, **options):
+        now = timezone.localtime()
+        cutoff = _add_months(_month_start(now.year, now.month), 1 - options['keep_months'])
+        out_dir = Path(options['output_dir'])
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        oldest = AuditLog.objects.order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest is None or oldest >= cutoff:
+            self.stdout.write("Nothing to archive.")
+            return
+
+        oldest = timezone.localtime(oldest)
+        month = _month_start(oldest.year, oldest.month)
+        while month < cutoff:
+            next_month = _add_months(month, 1)
+            rows = AuditLog.objects.filter(timestamp__gte=month, timestamp__lt=next_month)
+            if options['dry_run']:
+                self.stdout.write(f"{month:%Y-%m}: {rows.count()} rows")
+            else:
+                self._archive_month(rows, out_dir / f"auditlog-{month:%Y-%m}.jsonl.gz", f"{month:%Y-%m}")
+            month = next_month
+
+    def _archive_month(self, rows, path, label):
+        tmp = path.with_name(path.name + '.tmp')
+        count, last_id = 0, None
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            for row in rows.order_by('id').values(*FIELDS).iterator(chunk_size=2000):
+                f.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+                count, last_id = count + 1, row['id']
+        if not count:
+            tmp.unlink()
+            return
+
+        if path.exists():
+            # a gzip file may hold several members; append to the earlier run
+            with open(path, 'ab') as dst, open(tmp, 'rb') as src:
+                dst.write(src.read())
+            tmp.unlink()
+        else:
+            os.replace(tmp, path)
+
+        # only delete what made it into the file
+        with transaction.atomic():
+            deleted, _ = rows.filter(id__lte=last_id).delete()
+        self.stdout.write(f"{label}: archived {count} rows to {path}, deleted {deleted}")
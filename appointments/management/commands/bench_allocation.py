@@ -0,0 +1,55 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from appointments.utils import allocate_medical_tests, ALLOCATION_CHUNK_SIZE
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark allocate_medical_tests on synthetic rows and report the "
+        "query count per chunk. All writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000],
+                            help="Roster sizes to benchmark")
+        parser.add_argument('--chunk-size', type=int, default=ALLOCATION_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        self.stdout.write(f"{'rows':>8} {'chunks':>7} {'queries':>8} {'q/chunk':>8} {'seconds':>8}")
+        for n in options['rows']:
+            # a handful of shared first names forces username collisions
+            rows = [
+                {'name': f"{('John', 'Mary', 'Ade', 'Chidi')[i % 4]} Bench{i}",
+                 'matric_no': f"BENCH/{n}/{i:06d}",
+                 'department': 'CPT'}
+                for i in range(n)
+            ]
+            chunks = -(-n // chunk_size)
+            try:
+                with transaction.atomic():
+                    staff = User.objects.create(username='bench-staff')
+                    staff.profile.role = 'staff'
+                    staff.profile.save()
+                    with CaptureQueriesContext(connection) as ctx:
+                        started = perf_counter()
+                        allocate_medical_tests(rows, chunk_size=chunk_size)
+                        elapsed = perf_counter() - started
+                    raise _Rollback
+            except _Rollback:
+                pass
+            queries = len(ctx.captured_queries)
+            self.stdout.write(
+                f"{n:>8} {chunks:>7} {queries:>8} {queries / chunks:>8.1f} {elapsed:>8.2f}"
+            )
@@ -0,0 +1,41 @@
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from appointments import audit
+from appointments.models import AuditLog
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare audit-entry throughput of inline writes with the buffered "
+        "sink. Each entry is recorded in its own transaction, like a view "
+        "would. Rows written are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        n = options['entries']
+        user = User.objects.create(username='bench-audit')
+        try:
+            for sink in (audit.InlineSink(), audit.BufferedSink(max_age=3600)):
+                started = perf_counter()
+                for i in range(n):
+                    with transaction.atomic():
+                        sink.record(AuditLog(user=user, action="Bench entry", appointment_id=i))
+                sink.flush()
+                elapsed = perf_counter() - started
+                written = AuditLog.objects.filter(user=user).count()
+                AuditLog.objects.filter(user=user).delete()
+                self.stdout.write(
+                    f"{type(sink).__name__:>13}: {n / elapsed:>9.0f} entries/s "
+                    f"({written} written in {elapsed:.2f}s)"
+                )
+        finally:
+            user.delete()
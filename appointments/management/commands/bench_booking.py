@@ -0,0 +1,106 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from appointments import audit, availability, dashboards
+from appointments.booking import book_slot
+
+User = get_user_model()
+
+
+def _journal_mode():
+    if connection.vendor != 'sqlite':
+        return '-'
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure booking throughput on the configured database (run it once "
+        "per DB_ENGINE to compare backends): --students bookings of distinct "
+        "slots from --threads writers while --readers threads keep loading "
+        "staff dashboards. Uses throwaway users, deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=300)
+        parser.add_argument('--staff', type=int, default=5)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--readers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        n = options['students']
+        staff = []
+        for i in range(options['staff']):
+            member = User.objects.create(username=f'bench-booking-staff-{i}')
+            member.profile.role = 'staff'
+            member.profile.save()
+            staff.append(member)
+        students = [User.objects.create(username=f'bench-booking-student-{i}') for i in range(n)]
+
+        # every student gets their own slot, spread over the staff
+        per_staff = -(-n // len(staff))
+        slots = {m.pk: availability.next_free_slots(m.pk, per_staff) for m in staff}
+        attempts = [
+            (student, staff[i % len(staff)], slots[staff[i % len(staff)].pk][i // len(staff)])
+            for i, student in enumerate(students)
+        ]
+
+        outcomes = Counter()
+        reads = Counter()
+        writing = threading.Event()
+
+        def attempt(args):
+            student, member, slot = args
+            try:
+                return 'booked' if book_slot(student, member, slot).appointment else 'lost race'
+            except Exception as e:
+                return f'error: {type(e).__name__}: {e}'
+            finally:
+                connection.close()
+
+        def read(member):
+            try:
+                while writing.is_set():
+                    try:
+                        dashboards.staff_dashboard(member)
+                        reads['ok'] += 1
+                    except Exception as e:
+                        reads[f'error: {type(e).__name__}: {e}'] += 1
+            finally:
+                connection.close()
+
+        try:
+            writing.set()
+            readers = [threading.Thread(target=read, args=(staff[i % len(staff)],))
+                       for i in range(options['readers'])]
+            for reader in readers:
+                reader.start()
+            started = perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                outcomes.update(pool.map(attempt, attempts))
+            elapsed = perf_counter() - started
+            writing.clear()
+            for reader in readers:
+                reader.join()
+        finally:
+            writing.clear()
+            audit.flush()
+            User.objects.filter(username__startswith='bench-booking-').delete()
+
+        self.stdout.write(f"backend: {connection.vendor} (journal_mode={_journal_mode()})")
+        for outcome, count in outcomes.most_common():
+            self.stdout.write(f"{count:>6}  {outcome}")
+        for outcome, count in reads.most_common():
+            self.stdout.write(f"{count:>6}  dashboard read {outcome}")
+        self.stdout.write(
+            f"{outcomes['booked']} bookings in {elapsed:.2f}s = "
+            f"{outcomes['booked'] / elapsed:.1f} bookings/s"
+        )
@@ -0,0 +1,72 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from itertools import islice
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appointments.scheduling import SchedulingProblem, WORKING_DAYS, get_scheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the configured medical-test scheduler on a synthetic problem "
+        "(no database access) and report runtime, timetable quality and "
+        "any constraint violations."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000)
+        parser.add_argument('--staff', type=int, default=12)
+        parser.add_argument('--wards', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _problem(self, options):
+        rng = random.Random(options['seed'])
+        start = timezone.localdate() + timedelta(days=1)
+        staff_ids = list(range(1, options['staff'] + 1))
+        wards = {f"W{n}": rng.choice((1, 1, 2, 3)) for n in range(1, options['wards'] + 1)}
+        days = [start + timedelta(days=i) for i in range(120)]
+        leave = {s: set(rng.sample(days, 10)) for s in staff_ids}
+        closed = set(rng.sample(days, 4))
+        return SchedulingProblem(start, staff_ids, wards, leave, closed, set(), Counter(), Counter())
+
+    def handle(self, *args, **options):
+        n = options['students']
+        problem = self._problem(options)
+
+        started = perf_counter()
+        timetable = list(islice(get_scheduler(problem).slots(), n))
+        elapsed = perf_counter() - started
+
+        again = list(islice(get_scheduler(self._problem(options)).slots(), n))
+        violations = self._violations(problem, timetable)
+        load = Counter(staff for _, _, staff, _ in timetable)
+        days = sorted({day for day, _, _, _ in timetable})
+
+        self.stdout.write(f"students scheduled : {len(timetable)} in {elapsed * 1000:.1f} ms")
+        self.stdout.write(f"calendar span      : {days[0]} – {days[-1]} ({len(days)} test days)")
+        self.stdout.write(f"students per day   : {len(timetable) / len(days):.1f}")
+        self.stdout.write(f"staff load min/max : {min(load.values())}/{max(load.values())}")
+        self.stdout.write(f"deterministic      : {timetable == again}")
+        self.stdout.write(f"violations         : {len(violations)}")
+        for v in violations[:10]:
+            self.stdout.write(f"  {v}")
+        if violations or timetable != again:
+            raise CommandError("Scheduler produced an invalid or unstable timetable.")
+
+    def _violations(self, p, timetable):
+        found = []
+        staff_slots, ward_slots = Counter(), Counter()
+        for day, t, staff, ward in timetable:
+            staff_slots[(staff, day, t)] += 1
+            ward_slots[(day, t, ward)] += 1
+            if day.weekday() not in WORKING_DAYS or day in p.closed:
+                found.append(f"{day} is not a clinic day")
+            if day in p.leave.get(staff, ()):
+                found.append(f"staff {staff} is on leave on {day}")
+        found += [f"staff {s} double-booked at {d} {t}" for (s, d, t), c in staff_slots.items() if c > 1]
+        found += [f"ward {w} over capacity at {d} {t}" for (d, t, w), c in ward_slots.items() if c > p.wards[w]]
+        return found
@@ -0,0 +1,375 @@
+import io
+import json
+import random
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from appointments import audit, availability
+from appointments.management.commands.loadtest import login_session
+from appointments.models import Appointment, AuditLog, ImportJob, MedicalTestSchedule, Profile
+from appointments.utils import claim_next_import_job, run_import_job
+
+User = get_user_model()
+
+PREFIX = 'bench-suite-'
+MATRIC_PREFIX = 'BENCH-'
+PASSWORD = 'bench-suite-password'
+
+SCENARIOS = ('my_appointments', 'staff_requests', 'book_appointment', 'confirm_appointment',
+             'admin_csv_upload')
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))] if samples else 0.0
+
+
+class ClientTransport:
+    """
+    Requests through Django's test client, in this process. One client
+    (and session) per user and thread.
+    """
+    def __init__(self):
+        self._clients = threading.local()
+
+    def _client(self, user):
+        clients = self._clients.__dict__.setdefault('by_user', {})
+        if user.pk not in clients:
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            clients[user.pk] = client
+        return clients[user.pk]
+
+    def request(self, user, method, path, data=None):
+        client = self._client(user)
+        response = client.post(path, data or {}) if method == 'POST' else client.get(path)
+        return response.status_code, int(response.get('X-Query-Count', 0))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpTransport:
+    """
+    Requests to a running server (which must use the same database),
+    logged in through the login form like a browser.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self._sessions = threading.local()
+
+    def _session(self, user):
+        sessions = self._sessions.__dict__.setdefault('by_user', {})
+        if user.pk not in sessions:
+            opener = login_session(self.base_url, user.username, PASSWORD)
+            jar = next(h.cookiejar for h in opener.handlers
+                       if isinstance(h, urllib.request.HTTPCookieProcessor))
+            csrf = next((c.value for c in jar if c.name == 'csrftoken'), '')
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect())
+            sessions[user.pk] = (opener, csrf)
+        return sessions[user.pk]
+
+    def request(self, user, method, path, data=None):
+        opener, csrf = self._session(user)
+        url = self.base_url + path
+        headers = {'X-CSRFToken': csrf, 'Referer': url}
+        body = None
+        if method == 'POST':
+            body, content_type = _encode_form(data or {})
+            headers['Content-Type'] = content_type
+        try:
+            with opener.open(urllib.request.Request(url, data=body, headers=headers)) as response:
+                response.read()
+                return response.status, int(response.headers.get('X-Query-Count', 0))
+        except urllib.error.HTTPError as e:
+            return e.code, int(e.headers.get('X-Query-Count', 0))
+
+
+def _encode_form(data):
+    """
+    multipart/form-data if any value is a file-like object, else urlencoded.
+    """
+    if not any(hasattr(v, 'read') for v in data.values()):
+        return urllib.parse.urlencode(data, doseq=True).encode(), 'application/x-www-form-urlencoded'
+    boundary = uuid.uuid4().hex
+    out = io.BytesIO()
+    for name, value in data.items():
+        out.write(f'--{boundary}\r\n'.encode())
+        if hasattr(value, 'read'):
+            filename = getattr(value, 'name', name)
+            out.write(f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                      'Content-Type: text/csv\r\n\r\n'.encode())
+            out.write(value.read())
+        else:
+            out.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n{value}'.encode())
+        out.write(b'\r\n')
+    out.write(f'--{boundary}--\r\n'.encode())
+    return out.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the hot paths. Seeds a synthetic clinic (students, staff, "
+        "appointments, medical tests, audit entries), drives the dashboards, "
+        "booking, confirmation and the admin CSV upload with --concurrency "
+        "threads, and writes throughput, p50/p95/p99 latency and query counts "
+        "as JSON. Uses the test client, or a running server with --base-url. "
+        "The seeded data is removed afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--staff', type=int, default=20)
+        parser.add_argument('--appointments', type=int, default=3,
+                            help="Appointments per student")
+        parser.add_argument('--audit-entries', type=int, default=10000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help="Requests per scenario (uploads use a tenth)")
+        parser.add_argument('--import-rows', type=int, default=500,
+                            help="Rows per uploaded CSV")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=SCENARIOS,
+                            help="Scenario to run (repeatable, default all)")
+        parser.add_argument('--base-url', help="Benchmark a running server instead of the test client")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help="Write the JSON results to this file")
+        parser.add_argument('--compare', help="Earlier results file to compare against")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded data")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Benchmark data from an earlier run is present; "
+                               f"delete users named {PREFIX}* first.")
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        transport = HttpTransport(options['base_url']) if options['base_url'] else ClientTransport()
+
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'transport': 'http' if options['base_url'] else 'test-client',
+            'options': {k: options[k] for k in ('students', 'staff', 'appointments', 'audit_entries',
+                                                'requests', 'import_rows', 'concurrency', 'seed')},
+            'scenarios': {},
+        }
+        try:
+            started = perf_counter()
+            self._seed()
+            results['seed_seconds'] = round(perf_counter() - started, 3)
+            for name in options['scenarios'] or SCENARIOS:
+                self.stdout.write(f"Running {name}…")
+                results['scenarios'][name] = getattr(self, f'_scenario_{name}')(transport)
+        finally:
+            if not options['keep']:
+                self._cleanup()
+
+        self._report(results)
+
+    # -- data ---------------------------------------------------------------
+
+    def _seed(self):
+        o, rng = self.options, self.rng
+        password = make_password(PASSWORD)
+        departments = [code for code, _ in Profile.DEPARTMENT_CHOICES]
+
+        self.admin = User.objects.create_superuser(f'{PREFIX}admin', '', PASSWORD)
+        staff = User.objects.bulk_create([
+            User(username=f'{PREFIX}staff-{i}', password=password) for i in range(o['staff'])
+        ])
+        students = User.objects.bulk_create([
+            User(username=f'{PREFIX}student-{i}', first_name=f'Student {i}', password=password)
+            for i in range(o['students'])
+        ])
+        if any(u.pk is None for u in staff + students):
+            ids = dict(User.objects.filter(username__startswith=PREFIX).values_list('username', 'id'))
+            for u in staff + students:
+                u.pk = ids[u.username]
+        # bulk_create sends no signals, so the Profiles are created here
+        Profile.objects.bulk_create(
+            [Profile(user=u, role='staff') for u in staff]
+            + [Profile(user=u, role='student', matric_no=f'{MATRIC_PREFIX}{i:06d}',
+                       department=rng.choice(departments)) for i, u in enumerate(students)]
+        )
+        self.staff, self.students = staff, students
+
+        # appointments on each staff member's grid, from 30 days back onwards
+        today = timezone.localdate()
+        slots = [slot for d in range(-30, availability.BOOKING_WINDOW)
+                 for slot in availability.day_grid(today + timedelta(days=d))]
+        per_staff = -(-o['students'] * o['appointments'] // len(staff))
+        if per_staff > len(slots):
+            raise CommandError("Too many appointments for the staff grid; add --staff.")
+        now = timezone.now()
+        appointments = []
+        for member in staff:
+            for slot in rng.sample(slots, per_staff):
+                if slot < now:
+                    status = rng.choice(['attended', 'attended', 'no_show', 'cancelled'])
+                else:
+                    status = rng.choice(['pending', 'pending', 'confirmed'])
+                appointments.append(Appointment(
+                    student=rng.choice(students), staff=member, date_time=slot,
+                    status=status, reason_for_visit='Benchmark visit',
+                ))
+        Appointment.objects.bulk_create(appointments, batch_size=1000)
+
+        MedicalTestSchedule.objects.bulk_create([
+            MedicalTestSchedule(
+                student=profile, staff=staff[i % len(staff)],
+                scheduled_date=today + timedelta(days=1 + i // 70),
+                scheduled_time=availability.DAY_START, ward_number=f'W{i % 10 + 1}',
+            )
+            for i, profile in enumerate(Profile.objects.filter(matric_no__startswith=MATRIC_PREFIX))
+        ], batch_size=1000)
+
+        kinds = [kind for kind, _ in AuditLog.KIND_CHOICES]
+        AuditLog.objects.bulk_create([
+            AuditLog(user=rng.choice(students), kind=kind, action=f'{kind} (benchmark)',
+                     timestamp=now - timedelta(minutes=i))
+            for i, kind in enumerate(rng.choice(kinds) for _ in range(o['audit_entries']))
+        ], batch_size=1000)
+
+    def _cleanup(self):
+        audit.flush()
+        for job in ImportJob.objects.filter(uploaded_by__username__startswith=PREFIX):
+            job.csv_file.delete(save=False)
+            job.delete()
+        bench_users = User.objects.filter(username__startswith=PREFIX)
+        imported = User.objects.filter(profile__matric_no__startswith=f'{MATRIC_PREFIX}IMP')
+        MedicalTestSchedule.objects.filter(staff__in=bench_users).delete()
+        imported.delete()
+        bench_users.delete()
+
+    # -- scenarios ----------------------------------------------------------
+
+    def _run(self, transport, jobs, ok_statuses=(200,)):
+        """
+        Fire `jobs` ((user, method, path, data) tuples) with the configured
+        concurrency and summarize latency, throughput and query counts.
+        """
+        def fire(job):
+            started = perf_counter()
+            try:
+                status, queries = transport.request(*job)
+            except Exception as e:
+                status, queries = f'{type(e).__name__}: {e}', 0
+            return perf_counter() - started, status, queries
+
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=self.options['concurrency']) as pool:
+            samples = list(pool.map(fire, jobs))
+        elapsed = perf_counter() - started
+
+        latencies = [s[0] * 1000 for s in samples]
+        queries = [s[2] for s in samples]
+        errors = [s[1] for s in samples if s[1] not in ok_statuses]
+        return {
+            'requests':       len(samples),
+            'errors':         len(errors),
+            'error_statuses': sorted({str(e) for e in errors})[:5],
+            'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+            'p50_ms':         round(_percentile(latencies, 50), 2),
+            'p95_ms':         round(_percentile(latencies, 95), 2),
+            'p99_ms':         round(_percentile(latencies, 99), 2),
+            'queries_mean':   round(sum(queries) / len(queries), 2) if queries else 0,
+            'queries_max':    max(queries, default=0),
+        }
+
+    def _scenario_my_appointments(self, transport):
+        jobs = [(self.rng.choice(self.students), 'GET', '/my-appointments/', None)
+                for _ in range(self.options['requests'])]
+        return self._run(transport, jobs)
+
+    def _scenario_staff_requests(self, transport):
+        jobs = [(self.rng.choice(self.staff), 'GET', '/staff/requests/', None)
+                for _ in range(self.options['requests'])]
+        return self._run(transport, jobs)
+
+    def _scenario_book_appointment(self, transport):
+        n = self.options['requests']
+        free = {m.pk: availability.next_free_slots(m.pk, -(-n // len(self.staff))) for m in self.staff}
+        jobs = []
+        for i in range(n):
+            member = self.staff[i % len(self.staff)]
+            if not free[member.pk]:
+                continue
+            jobs.append((self.rng.choice(self.students), 'POST', '/book/', {
+                'staff': member.pk,
+                'date_time': availability.format_slot(free[member.pk].pop(0)),
+                'reason_for_visit': 'Benchmark booking',
+            }))
+        # a successful booking redirects to the student's appointments
+        return self._run(transport, jobs, ok_statuses=(302,))
+
+    def _scenario_confirm_appointment(self, transport):
+        pending = list(Appointment.objects.filter(
+            staff__in=self.staff, status='pending'
+        ).select_related('staff').order_by('?')[:self.options['requests']])
+        jobs = [(appt.staff, 'POST', f'/staff/confirm/{appt.pk}/', {'action': 'confirm'})
+                for appt in pending]
+        return self._run(transport, jobs, ok_statuses=(302,))
+
+    def _scenario_admin_csv_upload(self, transport):
+        uploads = max(1, self.options['requests'] // 10)
+        rows = self.options['import_rows']
+        jobs = []
+        for u in range(uploads):
+            csv_text = 'name,matric_no,department\n' + ''.join(
+                f'Imported{u}x{i} Student,{MATRIC_PREFIX}IMP{u:03d}{i:05d},CPT\n' for i in range(rows)
+            )
+            upload = io.BytesIO(csv_text.encode())
+            upload.name = f'bench-{u}.csv'
+            jobs.append((self.admin, 'POST', '/admin/appointments/medicaltestschedule/upload-csv/',
+                         {'csv_file': upload}))
+        result = self._run(transport, jobs, ok_statuses=(302,))
+
+        # then work the queue the uploads filled, as run_import_worker would
+        started, imported = perf_counter(), 0
+        while (job := claim_next_import_job(f'{PREFIX}worker')) is not None:
+            run_import_job(job)
+            imported += rows
+        elapsed = perf_counter() - started
+        result['import_rows'] = imported
+        result['import_rows_per_second'] = round(imported / elapsed, 1) if elapsed else 0
+        return result
+
+    # -- output -------------------------------------------------------------
+
+    def _report(self, results):
+        text = json.dumps(results, indent=2)
+        if self.options['output']:
+            with open(self.options['output'], 'w') as f:
+                f.write(text + '\n')
+            self.stdout.write(f"Results written to {self.options['output']}")
+        else:
+            self.stdout.write(text)
+
+        if self.options['compare']:
+            with open(self.options['compare']) as f:
+                baseline = json.load(f)['scenarios']
+            self.stdout.write(f"\n{'scenario':<22} {'req/s':>16} {'p95 ms':>18} {'queries':>14}")
+            for name, now in results['scenarios'].items():
+                before = baseline.get(name)
+                if before is None:
+                    continue
+                self.stdout.write(
+                    f"{name:<22} "
+                    f"{before['throughput_rps']:>7} -> {now['throughput_rps']:<7}"
+                    f"{before['p95_ms']:>8} -> {now['p95_ms']:<8}"
+                    f"{before['queries_mean']:>5} -> {now['queries_mean']:<5}"
+                )
@@ -0,0 +1,95 @@
+from datetime import date, time, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointments import dashboards
+from appointments.models import Appointment, AuditLog, MedicalTestSchedule, Profile
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN every dashboard query and fail if any of them scans a whole "
+        "table instead of using an index. With --seed N, N appointments, "
+        "test slots and audit rows are generated first and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help="Rows to generate before explaining (e.g. 1000000)")
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self._seed(options['seed'])
+                failures = self._explain_all()
+                raise _Rollback
+        except _Rollback:
+            pass
+        if failures:
+            raise CommandError(f"Table scans in: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All dashboard queries use an index."))
+
+    def _explain_all(self):
+        staff = User.objects.filter(profile__role='staff').first()
+        student = User.objects.filter(profile__role='student').first()
+        if staff is None or student is None:
+            raise CommandError("Need at least one staff and one student (or use --seed).")
+        if connection.vendor == 'sqlite':
+            # let the planner see the real row counts
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        failures = []
+        for name, plan in dashboards.query_plans(staff, student):
+            scan = dashboards.TABLE_SCAN.search(plan)
+            self.stdout.write(f"== {name}: {'TABLE SCAN' if scan else 'ok'}")
+            self.stdout.write(plan)
+            if scan:
+                failures.append(name)
+        return failures
+
+    def _seed(self, n):
+        self.stdout.write(f"Seeding {n} rows…")
+        n_staff = max(1, n // 20000)
+        n_students = max(1, n // 10)
+        staff = User.objects.bulk_create(
+            [User(username=f'explain-staff-{i}') for i in range(n_staff)], batch_size=5000)
+        students = User.objects.bulk_create(
+            [User(username=f'explain-student-{i}') for i in range(n_students)], batch_size=5000)
+        Profile.objects.bulk_create(
+            [Profile(user=u, role='staff') for u in staff], batch_size=5000)
+        profiles = Profile.objects.bulk_create(
+            [Profile(user=u, role='student') for u in students], batch_size=5000)
+
+        start = timezone.now() - timedelta(days=365)
+        statuses = ('pending', 'confirmed', 'attended', 'cancelled', 'no_show', 'rejected')
+        Appointment.objects.bulk_create((
+            Appointment(
+                student=students[i % n_students],
+                staff=staff[i % n_staff],
+                date_time=start + timedelta(minutes=30 * (i // n_staff)),
+                status=statuses[i % len(statuses)],
+            ) for i in range(n)
+        ), batch_size=5000)
+        MedicalTestSchedule.objects.bulk_create((
+            MedicalTestSchedule(
+                student=p,
+                staff=staff[i % n_staff],
+                scheduled_date=date.today() + timedelta(days=i // 70),
+                scheduled_time=time(9 + (i % 7) // 2, 30 * (i % 2)),
+                ward_number=f"W{i % 10 + 1}",
+            ) for i, p in enumerate(profiles)
+        ), batch_size=5000)
+        AuditLog.objects.bulk_create((
+            AuditLog(user=students[i % n_students], action="Seeded") for i in range(n)
+        ), batch_size=5000)
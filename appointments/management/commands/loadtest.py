@@ -0,0 +1,108 @@
+import http.cookiejar
+import re
+import statistics
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+CSRF_INPUT = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def login_session(base_url, username, password):
+    """
+    An opener logged in through the normal login form, so the requests
+    go through sessions, auth and CSRF exactly as a browser's would.
+    """
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    login_url = base_url + '/accounts/login/'
+    page = opener.open(login_url).read().decode()
+    token = CSRF_INPUT.search(page)
+    if token is None:
+        raise CommandError(f"no CSRF token on {login_url}")
+    body = urllib.parse.urlencode({
+        'username': username,
+        'password': password,
+        'csrfmiddlewaretoken': token.group(1),
+    }).encode()
+    request = urllib.request.Request(login_url, data=body, headers={'Referer': login_url})
+    response = opener.open(request)
+    if response.geturl().rstrip('/') == login_url.rstrip('/'):
+        raise CommandError(f"login as {username} failed on {base_url}")
+    return opener
+
+
+def _percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test running servers and compare them: logs in as --username, "
+        "fires --requests GETs at each --path with --concurrency threads and "
+        "reports requests/second and p50/p99 latency per target. Start the "
+        "WSGI server (runserver) and the ASGI one (SERVER_MODE=asgi) first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=URL',
+            help="server to test, e.g. wsgi=http://127.0.0.1:8000 (repeatable)",
+        )
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument(
+            '--path', action='append', dest='paths', metavar='PATH',
+            help="page to request (repeatable, default /my-appointments/)",
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/my-appointments/']
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep:
+                raise CommandError(f"--target must be NAME=URL, got {target!r}")
+            targets.append((name, url.rstrip('/')))
+
+        self.stdout.write(f"{'target':<10} {'path':<24} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name, base_url in targets:
+            opener = login_session(base_url, options['username'], options['password'])
+            for path in paths:
+                rps, p50, p99, errors = self._run(opener, base_url + path, options)
+                self.stdout.write(
+                    f"{name:<10} {path:<24} {rps:>8.1f} {p50 * 1000:>8.1f} {p99 * 1000:>8.1f} {errors:>7}"
+                )
+
+    def _run(self, opener, url, options):
+        def fetch(_):
+            started = perf_counter()
+            try:
+                with opener.open(url) as response:
+                    response.read()
+                    ok = response.status == 200
+            except OSError:
+                ok = False
+            return perf_counter() - started, ok
+
+        # one untimed request to warm caches and connections
+        fetch(None)
+        started = perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(fetch, range(options['requests'])))
+        elapsed = perf_counter() - started
+
+        latencies = [latency for latency, _ in results]
+        errors = sum(1 for _, ok in results if not ok)
+        return (
+            len(results) / elapsed,
+            statistics.median(latencies),
+            _percentile(latencies, 99),
+            errors,
+        )
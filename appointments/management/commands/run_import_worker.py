@@ -0,0 +1,40 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.utils import claim_next_import_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued CSV imports. Start one worker per core you want to "
+        "give to imports; workers share the queue safely."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty")
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Import worker {worker} started.")
+        while True:
+            job = claim_next_import_job(worker)
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Running import #{job.pk}…")
+            try:
+                run_import_job(job)
+            except Exception as e:
+                # already recorded on the job; keep serving the queue
+                self.stderr.write(f"Import #{job.pk} failed: {e}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Import #{job.pk} done."))
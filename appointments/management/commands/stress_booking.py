@@ -0,0 +1,61 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from appointments import audit, availability
+from appointments.booking import book_slot
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire many parallel bookings at one slot and check that exactly one "
+        "wins and the rest get alternatives. Uses throwaway users, deleted "
+        "afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=32)
+
+    def handle(self, *args, **options):
+        n = options['students']
+        staff = User.objects.create(username='stress-staff')
+        staff.profile.role = 'staff'
+        staff.profile.save()
+        students = [User.objects.create(username=f'stress-student-{i}') for i in range(n)]
+        slot = availability.next_free_slots(staff.pk, 1)[0]
+
+        def attempt(student):
+            try:
+                result = book_slot(student, staff, slot, 'stress test')
+                if result.appointment:
+                    return 'booked'
+                return 'rejected with alternatives' if result.alternatives else 'rejected'
+            except Exception as e:
+                return f'error: {type(e).__name__}: {e}'
+            finally:
+                connection.close()
+
+        try:
+            started = perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                outcomes = Counter(pool.map(attempt, students))
+            elapsed = perf_counter() - started
+        finally:
+            # write the buffered audit rows before their users go
+            audit.flush()
+            User.objects.filter(username__startswith='stress-').delete()
+
+        for outcome, count in outcomes.most_common():
+            self.stdout.write(f"{count:>6}  {outcome}")
+        self.stdout.write(f"{n} attempts in {elapsed:.2f}s")
+        if outcomes['booked'] == 1:
+            self.stdout.write(self.style.SUCCESS("OK: exactly one booking won the slot."))
+        else:
+            self.stdout.write(self.style.ERROR(f"FAIL: {outcomes['booked']} bookings won the slot."))
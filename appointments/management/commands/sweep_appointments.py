@@ -0,0 +1,48 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from appointments.sweeper import SWEEP_CHUNK_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark appointments whose slot is over as attended (confirmed) or "
+        "expired (still pending). Safe to run from cron: it works in small "
+        "committed chunks and a rerun resumes where an interrupted one stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only count what would be swept")
+        parser.add_argument('--loop', type=float, metavar='SECONDS',
+                            help="Keep sweeping every SECONDS instead of exiting")
+
+    def handle(self, *args, **options):
+        while True:
+            self._sweep_once(options)
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def _sweep_once(self, options):
+        if options['dry_run']:
+            for from_status, to_status, count in sweep(dry_run=True):
+                self.stdout.write(f"{count:>8}  {from_status} -> {to_status}")
+            return
+
+        totals = Counter()
+        started = time.perf_counter()
+        for from_status, to_status, rows in sweep(chunk_size=options['chunk_size']):
+            totals[(from_status, to_status)] += rows
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{from_status} -> {to_status}: {rows} rows committed")
+        elapsed = time.perf_counter() - started
+
+        for (from_status, to_status), rows in totals.items():
+            self.stdout.write(f"{rows:>8}  {from_status} -> {to_status}")
+        swept = sum(totals.values())
+        rate = swept / elapsed if elapsed else 0
+        self.stdout.write(f"Swept {swept} appointments in {elapsed:.2f}s ({rate:.0f} rows/s).")
@@ -0,0 +1,59 @@
+# appointments/middleware.py
+
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import instrumentation
+
+
+class PerformanceMiddleware:
+    """
+    Count the SQL queries each request runs (without needing DEBUG) and
+    report them in an X-Query-Count response header. For a sample of
+    requests (PERF_SAMPLE_RATE), also time the SQL and template rendering
+    and record them per view name; see appointments.instrumentation.
+    Put it first in MIDDLEWARE so session and auth lookups are included.
+    Works in both sync and async stacks, so it doesn't force async views
+    onto a thread; the queries are seen on whichever thread's connection
+    runs them (appointments.instrumentation.install_wrapper).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, started = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        return self._finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats, token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.end_request(token)
+        return self._finish(request, response, stats, started)
+
+    def _start(self):
+        sampled = random.random() < instrumentation.sample_rate()
+        stats, token = instrumentation.start_request(sampled)
+        return stats, token, time.perf_counter()
+
+    def _finish(self, request, response, stats, started):
+        response['X-Query-Count'] = str(stats.queries)
+        if stats.sampled:
+            match = request.resolver_match
+            view = match.view_name if match else 'unresolved'
+            instrumentation.registry.add(view, time.perf_counter() - started, stats, response.status_code)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0004_importjob'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='appointment',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('rejected', 'cancelled')), _negated=True), fields=('staff', 'date_time'), name='unique_live_staff_slot'),
+        ),
+    ]
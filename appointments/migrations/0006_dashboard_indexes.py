@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0005_appointment_live_slot_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['staff', 'status', 'date_time'], name='appt_staff_status_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['staff', 'date_time'], name='appt_pending_staff_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['student', '-date_time'], name='appt_student_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', 'timestamp'], name='auditlog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicaltestschedule',
+            index=models.Index(fields=['staff', 'scheduled_date', 'scheduled_time'], name='mts_staff_date_time_idx'),
+        ),
+    ]
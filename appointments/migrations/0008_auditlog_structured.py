@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 14:14
+
+import re
+
+from django.db import migrations, models
+
+
+ACTION_RE = re.compile(r'^(Booked|Cancelled|Confirmed|Rejected) appointment (\d+)$')
+
+
+def backfill_kind(apps, schema_editor):
+    AuditLog = apps.get_model('appointments', 'AuditLog')
+    batch = []
+    for entry in AuditLog.objects.only('id', 'action').iterator(chunk_size=2000):
+        match = ACTION_RE.match(entry.action)
+        if match:
+            entry.kind = match.group(1).lower()
+            entry.appointment_id = int(match.group(2))
+            batch.append(entry)
+        if len(batch) >= 2000:
+            AuditLog.objects.bulk_update(batch, ['kind', 'appointment_id'])
+            batch = []
+    AuditLog.objects.bulk_update(batch, ['kind', 'appointment_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0007_auditlog_event_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='appointment_id',
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='kind',
+            field=models.CharField(choices=[('booked', 'Booked'), ('cancelled', 'Cancelled'), ('confirmed', 'Confirmed'), ('rejected', 'Rejected'), ('other', 'Other')], default='other', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='auditlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['kind', 'timestamp'], name='auditlog_kind_ts_idx'),
+        ),
+        migrations.RunPython(backfill_kind, migrations.RunPython.noop),
+    ]
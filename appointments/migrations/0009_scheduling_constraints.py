@@ -0,0 +1,52 @@
+# Generated by Django 4.2 on 2026-10-18 14:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0008_auditlog_structured'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClinicClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('reason', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Ward',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('capacity', models.PositiveIntegerField(default=1)),
+                ('active', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StaffLeave',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('reason', models.CharField(blank=True, max_length=100)),
+                ('staff', models.ForeignKey(limit_choices_to={'profile__role': 'staff'}, on_delete=django.db.models.deletion.CASCADE, related_name='leave', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['start_date'],
+            },
+        ),
+    ]
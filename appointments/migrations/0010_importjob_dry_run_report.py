@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_scheduling_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='dry_run',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='report',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
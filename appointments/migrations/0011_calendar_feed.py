@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0010_importjob_dry_run_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='medicaltestschedule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['student', 'updated_at'], name='appt_student_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['staff', 'updated_at'], name='appt_staff_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicaltestschedule',
+            index=models.Index(fields=['staff', 'updated_at'], name='mts_staff_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0011_calendar_feed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='kind',
+            field=models.CharField(choices=[('booked', 'Booked'), ('cancelled', 'Cancelled'), ('confirmed', 'Confirmed'), ('rejected', 'Rejected'), ('attended', 'Attended'), ('no_show', 'No-show'), ('other', 'Other')], default='other', max_length=10),
+        ),
+    ]
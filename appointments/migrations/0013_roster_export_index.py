@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0012_auditlog_sweep_kinds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='medicaltestschedule',
+            index=models.Index(fields=['scheduled_date', 'ward_number', 'scheduled_time'], name='mts_date_ward_idx'),
+        ),
+    ]
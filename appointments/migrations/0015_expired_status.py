@@ -0,0 +1,23 @@
+# Generated by Django 4.2 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0014_importjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('attended', 'Attended'), ('no_show', 'No-Show'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], default='pending', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='kind',
+            field=models.CharField(choices=[('booked', 'Booked'), ('cancelled', 'Cancelled'), ('confirmed', 'Confirmed'), ('rejected', 'Rejected'), ('attended', 'Attended'), ('no_show', 'No-show'), ('expired', 'Expired'), ('other', 'Other')], default='other', max_length=10),
+        ),
+    ]
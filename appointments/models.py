@@ -2,6 +2,7 @@
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class Profile(models.Model):
@@ -57,7 +58,11 @@ class Appointment(models.Model):
         ('no_show',   'No-Show'),
         ('rejected',  'Rejected'),
         ('cancelled', 'Cancelled'),
+        # a request still pending when its slot was over
+        ('expired',   'Expired'),
     ]
+    # statuses that give the staff member's slot back
+    RELEASED_STATUSES = ('rejected', 'cancelled')
 
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -76,18 +81,71 @@ class Appointment(models.Model):
     updated_at       = models.DateTimeField(auto_now=True)
 
     class Meta:
-        unique_together = ('staff', 'date_time')
-        ordering        = ['-date_time']
+        ordering    = ['-date_time']
+        constraints = [
+            # a slot is only held while the appointment is still live, so a
+            # cancelled or rejected booking can be taken by someone else
+            models.UniqueConstraint(
+                fields=['staff', 'date_time'],
+                condition=~models.Q(status__in=('rejected', 'cancelled')),
+                name='unique_live_staff_slot',
+            ),
+        ]
+        indexes = [
+            # staff dashboard lists and counts
+            models.Index(fields=['staff', 'status', 'date_time'], name='appt_staff_status_dt_idx'),
+            # the pending queue only, kept small (partial where supported)
+            models.Index(fields=['staff', 'date_time'], condition=models.Q(status='pending'),
+                         name='appt_pending_staff_dt_idx'),
+            # a student's history, newest first
+            models.Index(fields=['student', '-date_time'], name='appt_student_dt_idx'),
+            # MAX(updated_at) per user for the calendar feed ETags
+            models.Index(fields=['student', 'updated_at'], name='appt_student_updated_idx'),
+            models.Index(fields=['staff', 'updated_at'], name='appt_staff_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so the availability index can release the old slot
+        instance._loaded_slot = (instance.__dict__.get('date_time'),
+                                 instance.__dict__.get('status'))
+        return instance
 
     def __str__(self):
         return f"Appointment: {self.student.username} with {self.staff.username} on {self.date_time}"
 
 
 class AuditLog(models.Model):
+    KIND_CHOICES = [
+        ('booked',    'Booked'),
+        ('cancelled', 'Cancelled'),
+        ('confirmed', 'Confirmed'),
+        ('rejected',  'Rejected'),
+        ('attended',  'Attended'),
+        ('no_show',   'No-show'),
+        ('expired',   'Expired'),
+        ('other',     'Other'),
+    ]
+
     user      = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # human-readable summary, e.g. "Confirmed appointment 123"
     action    = models.CharField(max_length=50)
+    kind      = models.CharField(max_length=10, choices=KIND_CHOICES, default='other')
+    # plain column rather than a FK, so entries outlive their appointment
+    # and can be archived without touching the Appointment table
+    appointment_id = models.BigIntegerField(null=True, blank=True, db_index=True)
     details   = models.JSONField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # set when the event happens, which can be before a buffered flush
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'timestamp'], name='auditlog_user_ts_idx'),
+            # month ranges for the admin date drill-down and for archiving
+            models.Index(fields=['timestamp'], name='auditlog_ts_idx'),
+            models.Index(fields=['kind', 'timestamp'], name='auditlog_kind_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} {self.action} @ {self.timestamp}"
@@ -120,11 +178,120 @@ class MedicalTestSchedule(models.Model):
     ward_number = models.CharField(max_length=10)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['scheduled_date', 'scheduled_time']
         unique_together = ('student',)
+        indexes = [
+            # a staff member's test slots in date order
+            models.Index(fields=['staff', 'scheduled_date', 'scheduled_time'], name='mts_staff_date_time_idx'),
+            models.Index(fields=['staff', 'updated_at'], name='mts_staff_updated_idx'),
+            # roster exports: by day, then ward
+            models.Index(fields=['scheduled_date', 'ward_number', 'scheduled_time'], name='mts_date_ward_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so the availability index can drop the old day
+        instance._loaded_day = (instance.__dict__.get('staff_id'),
+                                instance.__dict__.get('scheduled_date'))
+        return instance
 
     def __str__(self):
         matric = self.student.matric_no if self.student else '—'
         return f"{matric} → {self.scheduled_date} @ {self.scheduled_time}"
+
+
+class ImportJob(models.Model):
+    """
+    A queued CSV roster upload, processed by the `run_import_worker`
+    management command instead of inside the admin request.
+    """
+    STATUS_CHOICES = [
+        ('queued',  'Queued'),
+        ('running', 'Running'),
+        ('done',    'Done'),
+        ('failed',  'Failed'),
+    ]
+
+    csv_file = models.FileField(upload_to='imports/')
+    uploaded_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='import_jobs'
+    )
+    status         = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # only report what the import would change
+    dry_run        = models.BooleanField(default=False)
+    rows_processed = models.PositiveIntegerField(default=0)
+    # counts from allocate_medical_tests: created, updated, unchanged, …
+    report         = models.JSONField(null=True, blank=True)
+    error          = models.TextField(blank=True)
+    worker         = models.CharField(max_length=100, blank=True)
+    created_at     = models.DateTimeField(auto_now_add=True)
+    started_at     = models.DateTimeField(null=True, blank=True)
+    # touched after every chunk; a running job that stops updating it
+    # lost its worker and is queued again (utils.claim_next_import_job)
+    heartbeat_at   = models.DateTimeField(null=True, blank=True)
+    finished_at    = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.get_status_display()})"
+
+
+class Ward(models.Model):
+    """
+    A ward that hosts medical tests, and how many students it can take
+    in one time slot.
+    """
+    code     = models.CharField(max_length=10, unique=True)
+    capacity = models.PositiveIntegerField(default=1)
+    active   = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ['code']
+
+    def __str__(self):
+        return f"{self.code} (capacity {self.capacity})"
+
+
+class StaffLeave(models.Model):
+    """
+    Days (inclusive) a staff member can't run medical tests.
+    """
+    staff = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        limit_choices_to={'profile__role': 'staff'},
+        on_delete=models.CASCADE,
+        related_name='leave'
+    )
+    start_date = models.DateField()
+    end_date   = models.DateField()
+    reason     = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['start_date']
+
+    def __str__(self):
+        return f"{self.staff.username}: {self.start_date} – {self.end_date}"
+
+
+class ClinicClosure(models.Model):
+    """
+    A day with no medical tests at all (public holiday, exams, …).
+    """
+    date   = models.DateField(unique=True)
+    reason = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['date']
+
+    def __str__(self):
+        return f"{self.date} {self.reason}".strip()
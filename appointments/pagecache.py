@@ -0,0 +1,78 @@
+# appointments/pagecache.py
+"""
+Whole-page cache for the async dashboards. A rendered page is stored
+under the user's change counter (appointments.versions), so any save to
+their appointments or medical-test slots makes it unreachable, and a
+repeat view is served from the cache without running the dashboard's
+queries or rendering its template.
+
+Pages carry a CSRF token and may show one-off messages, so the key also
+includes the CSRF cookie, and a request with no cookie yet or with
+messages waiting is passed straight to the view. Hits, misses and
+bypasses are counted in the instrumentation registry.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import versions
+from .instrumentation import registry
+
+METRIC = 'clinic_page_cache_requests_total'
+
+
+def _has_messages(request):
+    storage = getattr(request, '_messages', None)
+    # len() loads the pending messages without marking them as shown
+    return storage is not None and len(storage) > 0
+
+
+async def _page_key(request):
+    """
+    The cache key for this request, or None when it must not be cached.
+    """
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME)
+    if not token or await sync_to_async(_has_messages)(request):
+        return None
+    digest = hashlib.md5(f"{request.get_full_path()}\n{token}".encode()).hexdigest()
+    version = await versions.auser_version(request.user.pk)
+    return f"page:{request.user.pk}:{version}:{digest}"
+
+
+def cache_page_per_user(view_func):
+    """
+    Cache an `async def` view's successful GET responses per user. Goes
+    inside async_role_required, which has already resolved request.user.
+    """
+    @wraps(view_func)
+    async def _wrapped_view(request, *args, **kwargs):
+        if request.method != 'GET':
+            return await view_func(request, *args, **kwargs)
+        view = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+
+        key = await _page_key(request)
+        if key is None:
+            registry.incr(METRIC, view=view, result='bypass')
+            return await view_func(request, *args, **kwargs)
+
+        cached = await cache.aget(key)
+        if cached is not None:
+            registry.incr(METRIC, view=view, result='hit')
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Page-Cache'] = 'hit'
+            return response
+
+        registry.incr(METRIC, view=view, result='miss')
+        response = await view_func(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            await cache.aset(key, (response.content, response['Content-Type']),
+                             getattr(settings, 'PAGE_CACHE_TIMEOUT', 120))
+            response['X-Page-Cache'] = 'miss'
+        return response
+    return _wrapped_view
@@ -0,0 +1,89 @@
+# appointments/pagination.py
+"""
+Keyset (cursor) pagination: each page continues from the ordering values
+of the previous page's last row, so fetching page 50 costs the same as
+page 1, unlike OFFSET.
+"""
+
+import base64
+import json
+from collections import namedtuple
+
+from django.db.models import Q
+
+PAGE_SIZE = 25
+
+Page = namedtuple('Page', ['rows', 'next'])
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Raises ValueError for anything that isn't a cursor we produced.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"bad cursor: {e}")
+    # what encode_cursor makes: dates and times as strings, then the id
+    if not (isinstance(values, list) and values
+            and all(isinstance(v, str) for v in values[:-1])
+            and type(values[-1]) is int):
+        raise ValueError("bad cursor")
+    return values
+
+
+def _after(ordering, values):
+    """
+    Q matching rows that sort strictly after `values` under `ordering`,
+    i.e. (a > x) OR (a = x AND b > y) OR …, with < for descending fields.
+    """
+    q = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        op = 'lt' if field.startswith('-') else 'gt'
+        step = Q(**{f'{name}__{op}': values[i]})
+        for prev, value in zip(ordering[:i], values):
+            step &= Q(**{prev.lstrip('-'): value})
+        q |= step
+    return q
+
+
+def _page_queryset(queryset, ordering, cursor, size):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(ordering):
+            raise ValueError("bad cursor")
+        queryset = queryset.filter(_after(ordering, values))
+    return queryset[:size + 1]
+
+
+def _make_page(rows, ordering, size):
+    if len(rows) <= size:
+        return Page(rows, None)
+    rows = rows[:size]
+    last = rows[-1]
+    return Page(rows, encode_cursor([getattr(last, f.lstrip('-')) for f in ordering]))
+
+
+def keyset_page(queryset, ordering, cursor=None, size=PAGE_SIZE):
+    """
+    One page of `queryset` ordered by `ordering`, which must end in a
+    unique field (normally 'id'). Returns Page(rows, next), where `next`
+    is the cursor for the following page or None on the last page.
+    """
+    rows = list(_page_queryset(queryset, ordering, cursor, size))
+    return _make_page(rows, ordering, size)
+
+
+async def akeyset_page(queryset, ordering, cursor=None, size=PAGE_SIZE):
+    """
+    Async keyset_page, fetching through the async ORM.
+    """
+    rows = [row async for row in _page_queryset(queryset, ordering, cursor, size)]
+    return _make_page(rows, ordering, size)
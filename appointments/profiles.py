@@ -0,0 +1,83 @@
+# appointments/profiles.py
+"""
+Profile lifecycle. Every new user gets a default Profile from the
+post_save signal (create_profile); signup then sets its own fields with
+update_profile, in the same transaction. Afterwards only fields that
+actually changed are written. Nothing touches the Profile on ordinary
+User saves such as the last_login update at sign-in, and bulk imports
+create Profiles directly with bulk_create.
+
+Roles are cached per user id (get_role), so authorization checks don't
+query the Profile table; Profile saves and deletes drop the cached role.
+"""
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Profile
+
+ROLE_TIMEOUT = 5 * 60
+
+
+def create_profile(user, **fields):
+    """
+    Give a just-inserted `user` its Profile, in one INSERT.
+    """
+    return Profile.objects.create(user=user, **fields)
+
+
+def update_profile(profile, **fields):
+    """
+    Set `fields` on `profile`, writing just the columns that changed and
+    nothing if it already matches.
+    """
+    changed = [name for name, value in fields.items() if getattr(profile, name) != value]
+    for name in changed:
+        setattr(profile, name, fields[name])
+    if changed:
+        profile.save(update_fields=changed)
+    return profile
+
+
+def create_user(user, **profile_fields):
+    """
+    Save a new, unsaved `user` and give its Profile `profile_fields`. The
+    post_save signal has created the Profile (and cached it on the user)
+    by the time it is updated here.
+    """
+    with transaction.atomic():
+        user.save()
+        return update_profile(user.profile, **profile_fields)
+
+
+def _role_key(user_id):
+    return f"role:{user_id}"
+
+
+def get_role(user):
+    """
+    The user's Profile.role, or None if they have no Profile. Served from
+    the cache; only a miss queries the database.
+    """
+    key = _role_key(user.pk)
+    role = cache.get(key)
+    if role is None:
+        role = Profile.objects.filter(user_id=user.pk).values_list('role', flat=True).first() or ''
+        cache.set(key, role, ROLE_TIMEOUT)
+    return role or None
+
+
+async def aget_role(user):
+    """
+    get_role for async views, on the async cache and ORM APIs.
+    """
+    key = _role_key(user.pk)
+    role = await cache.aget(key)
+    if role is None:
+        role = await Profile.objects.filter(user_id=user.pk).values_list('role', flat=True).afirst() or ''
+        await cache.aset(key, role, ROLE_TIMEOUT)
+    return role or None
+
+
+def invalidate_role(user_id):
+    cache.delete(_role_key(user_id))
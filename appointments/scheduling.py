@@ -0,0 +1,148 @@
+# appointments/scheduling.py
+"""
+Medical-test scheduling engine.
+
+load_problem() gathers everything that constrains the timetable (staff on
+duty, their leave, ward capacities, clinic closures, and slots already
+taken by appointments or earlier imports) into a SchedulingProblem. A
+scheduler turns that into an endless, deterministic stream of free
+(date, time, staff_id, ward) slots. The scheduler class is chosen by the
+MEDICAL_TEST_SCHEDULER setting.
+"""
+
+import heapq
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Appointment, ClinicClosure, MedicalTestSchedule, StaffLeave, Ward
+
+User = get_user_model()
+
+DAILY_SLOTS   = [time(9,0), time(9,30), time(10,0), time(10,30),
+                 time(11,0), time(11,30), time(12,0)]
+SLOT_LENGTH   = timedelta(minutes=30)
+WORKING_DAYS  = (0, 1, 2, 3, 4)     # Mon–Fri
+DEFAULT_WARDS = {f"W{n}": 1 for n in range(1, 11)}
+HORIZON_DAYS  = 366                 # give up if nothing is free within a year
+
+
+class SchedulingError(Exception):
+    pass
+
+
+# start_date:  first day that may be used
+# staff_ids:   staff who run tests, in a fixed order
+# wards:       {ward code: students per slot}
+# leave:       {staff_id: set of dates off}
+# closed:      set of dates with no tests
+# busy:        {(staff_id, date, time)} already occupied
+# ward_used:   Counter of (date, time, ward) places already taken
+# staff_load:  Counter of tests each staff member already has from start_date
+SchedulingProblem = namedtuple('SchedulingProblem', [
+    'start_date', 'staff_ids', 'wards', 'leave', 'closed', 'busy', 'ward_used', 'staff_load',
+])
+
+
+def _slot_of(dt):
+    """
+    The DAILY_SLOTS entry a datetime falls into, or None.
+    """
+    local = timezone.localtime(dt).replace(tzinfo=None)
+    for t in DAILY_SLOTS:
+        start = datetime.combine(local.date(), t)
+        if start <= local < start + SLOT_LENGTH:
+            return t
+    return None
+
+
+def load_problem(start_date=None):
+    """
+    Build a SchedulingProblem from the database with a fixed number of
+    queries, starting tomorrow unless `start_date` is given.
+    """
+    start_date = start_date or timezone.localdate() + timedelta(days=1)
+
+    staff_ids = list(
+        User.objects.filter(profile__role='staff').order_by('id').values_list('id', flat=True)
+    )
+    wards = dict(Ward.objects.filter(active=True).values_list('code', 'capacity')) or DEFAULT_WARDS
+
+    leave = defaultdict(set)
+    for staff_id, start, end in StaffLeave.objects.filter(
+        end_date__gte=start_date
+    ).values_list('staff_id', 'start_date', 'end_date'):
+        day = max(start, start_date)
+        while day <= end:
+            leave[staff_id].add(day)
+            day += timedelta(days=1)
+
+    closed = set(ClinicClosure.objects.filter(date__gte=start_date).values_list('date', flat=True))
+
+    busy, ward_used, staff_load = set(), Counter(), Counter()
+    for staff_id, day, t, ward in MedicalTestSchedule.objects.filter(
+        scheduled_date__gte=start_date
+    ).values_list('staff_id', 'scheduled_date', 'scheduled_time', 'ward_number'):
+        busy.add((staff_id, day, t))
+        ward_used[(day, t, ward)] += 1
+        staff_load[staff_id] += 1
+
+    tz = timezone.get_current_timezone()
+    for staff_id, dt in Appointment.objects.filter(
+        date_time__gte=timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    ).exclude(status__in=Appointment.RELEASED_STATUSES).values_list('staff_id', 'date_time'):
+        t = _slot_of(dt)
+        if t is not None:
+            busy.add((staff_id, timezone.localtime(dt).date(), t))
+
+    return SchedulingProblem(start_date, staff_ids, wards, leave, closed, busy, ward_used, staff_load)
+
+
+class GreedyScheduler:
+    """
+    Fills slots in date/time order. In each slot every free staff member
+    takes one student, least-loaded first, and each student goes to the
+    ward with the most room left. Ties break on staff id and ward order,
+    so the same problem always gives the same timetable.
+    """
+    def __init__(self, problem):
+        self.problem = problem
+
+    def slots(self):
+        p = self.problem
+        if not p.staff_ids:
+            raise SchedulingError("No staff available to run medical tests.")
+        load = Counter(p.staff_load)
+        ward_order = {ward: i for i, ward in enumerate(p.wards)}
+
+        day = p.start_date
+        for _ in range(HORIZON_DAYS):
+            if day.weekday() in WORKING_DAYS and day not in p.closed:
+                on_duty = [s for s in p.staff_ids if day not in p.leave.get(s, ())]
+                for t in DAILY_SLOTS:
+                    staff = sorted((load[s], s) for s in on_duty if (s, day, t) not in p.busy)
+                    rooms = [
+                        (-(cap - p.ward_used[(day, t, ward)]), ward_order[ward], ward)
+                        for ward, cap in p.wards.items()
+                        if cap > p.ward_used[(day, t, ward)]
+                    ]
+                    heapq.heapify(rooms)
+                    for _, staff_id in staff:
+                        if not rooms:
+                            break
+                        neg_room, order, ward = heapq.heappop(rooms)
+                        if neg_room < -1:
+                            heapq.heappush(rooms, (neg_room + 1, order, ward))
+                        load[staff_id] += 1
+                        yield day, t, staff_id, ward
+            day += timedelta(days=1)
+        raise SchedulingError(f"No free medical-test slots in the next {HORIZON_DAYS} days.")
+
+
+def get_scheduler(problem):
+    path = getattr(settings, 'MEDICAL_TEST_SCHEDULER', 'appointments.scheduling.GreedyScheduler')
+    return import_string(path)(problem)
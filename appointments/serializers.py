@@ -0,0 +1,63 @@
+# appointments/serializers.py
+"""
+Read-only serializers for the API. Everything they render is reached
+through select_related in the API views, so a page is one query.
+"""
+
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from .models import Appointment, MedicalTestSchedule
+
+
+class SparseFieldsMixin:
+    """
+    Honour ?fields=a,b,c by dropping every other top-level field, so
+    clients only pay for (and receive) what they show.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        wanted = request and request.query_params.get('fields')
+        if wanted:
+            keep = {name.strip() for name in wanted.split(',')}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    name = serializers.SerializerMethodField()
+
+    class Meta:
+        model  = get_user_model()
+        fields = ['id', 'username', 'name']
+
+    def get_name(self, user):
+        return user.get_full_name() or user.get_username()
+
+
+class AppointmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    student = UserSummarySerializer()
+    staff   = UserSummarySerializer()
+
+    class Meta:
+        model  = Appointment
+        fields = ['id', 'date_time', 'status', 'reason_for_visit',
+                  'student', 'staff', 'created_at', 'updated_at']
+
+
+class MedicalTestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    student    = UserSummarySerializer(source='student.user', allow_null=True)
+    matric_no  = serializers.CharField(source='student.matric_no', allow_null=True)
+    department = serializers.CharField(source='student.department', allow_null=True)
+    staff      = UserSummarySerializer()
+
+    class Meta:
+        model  = MedicalTestSchedule
+        fields = ['id', 'scheduled_date', 'scheduled_time', 'ward_number',
+                  'student', 'matric_no', 'department', 'staff', 'updated_at']
+
+
+class SlotSerializer(serializers.Serializer):
+    start = serializers.DateTimeField()
+    label = serializers.CharField()
@@ -1,15 +1,45 @@
 from django.conf import settings
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
 from django.dispatch import receiver
-from django.contrib.auth.models import User
 
-from .models import Profile
+from . import availability, dashboards, profiles, versions
+from .models import Appointment, MedicalTestSchedule, Profile
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    # only new users need a Profile; later User saves (e.g. last_login at
+    # sign-in) leave it alone. Signup fills it in, see profiles.create_user()
+    if created and not raw:
+        profiles.create_profile(instance)
 
-@receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def drop_cached_role(sender, instance, **kwargs):
+    profiles.invalidate_role(instance.user_id)
+    versions.bump(instance.user_id)
+
+@receiver(post_save, sender=Appointment)
+def update_slot_index(sender, instance, **kwargs):
+    # only touch the shared index once the booking is really in the DB
+    transaction.on_commit(lambda: availability.appointment_saved(instance))
+    # after commit too, or a concurrent reader could re-cache the old counts
+    transaction.on_commit(lambda: dashboards.invalidate_staff_counts(instance.staff_id))
+    versions.bump(instance.student_id, instance.staff_id)
+
+@receiver(post_delete, sender=Appointment)
+def release_slot_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: availability.appointment_deleted(instance))
+    transaction.on_commit(lambda: dashboards.invalidate_staff_counts(instance.staff_id))
+    versions.bump(instance.student_id, instance.staff_id)
+
+@receiver(post_save, sender=MedicalTestSchedule)
+@receiver(post_delete, sender=MedicalTestSchedule)
+def bump_test_slot_versions(sender, instance, **kwargs):
+    student_user_id = (Profile.objects.filter(pk=instance.student_id)
+                       .values_list('user_id', flat=True).first())
+    versions.bump(instance.staff_id, student_user_id)
+    # the slot's staff member is busy then; drop the old and new days
+    staff_days = [(instance.staff_id, instance.scheduled_date),
+                  getattr(instance, '_loaded_day', (instance.staff_id, instance.scheduled_date))]
+    transaction.on_commit(lambda: availability.forget_days(staff_days))
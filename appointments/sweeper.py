@@ -0,0 +1,102 @@
+# appointments/sweeper.py
+"""
+Moves appointments whose slot is over out of the live states, so the
+pending and confirmed sets stop growing: confirmed appointments become
+'attended' and requests nobody confirmed in time become 'expired' (the
+student never had a confirmed slot to miss, so they are not 'no_show').
+
+Work is done in chunks of set-based UPDATEs, each in its own transaction
+with its audit entries. A chunk either commits whole or not at all, and
+the next run simply picks up the rows still in the old state, so an
+interrupted sweep resumes where it stopped without a checkpoint.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import audit, dashboards, versions
+from .availability import SLOT_MINUTES
+from .models import Appointment
+
+User = get_user_model()
+
+# (from status, to status), applied in order
+SWEEP_RULES = (
+    ('confirmed', 'attended'),
+    ('pending',   'expired'),
+)
+
+# how long after a slot ends before it is swept, so staff can still act
+SWEEP_GRACE = timedelta(hours=1)
+
+SWEEP_CHUNK_SIZE = 1000
+
+
+def _invalidate_counts(staff_ids):
+    for pk in staff_ids:
+        dashboards.invalidate_staff_counts(pk)
+
+
+def _sweep_chunk(from_status, to_status, cutoff, after_id, size):
+    """
+    Transition the next `size` overdue rows with id > after_id. Returns
+    (last id looked at, number of rows changed), or (None, 0) when no
+    overdue rows are left.
+    """
+    # two overlapping runs split the rows instead of waiting on each other
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        ids = list(
+            Appointment.objects.select_for_update(skip_locked=skip_locked, of=('self',))
+            .filter(status=from_status, date_time__lt=cutoff, id__gt=after_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:size]
+        )
+        if not ids:
+            return None, 0
+        stamp = timezone.now()
+        Appointment.objects.filter(id__in=ids, status=from_status).update(
+            status=to_status, updated_at=stamp
+        )
+        # audit exactly the rows this UPDATE changed, as they now are
+        rows = list(
+            Appointment.objects.filter(id__in=ids, status=to_status, updated_at=stamp)
+            .values_list('id', 'student_id', 'staff_id', 'date_time')
+        )
+        if not rows:
+            return ids[-1], 0
+        # entries are filed under the appointment's staff member and
+        # written inline: a long-running sweeper has no request cycle to
+        # flush a buffer, and this way each chunk commits with its audit
+        audit.record_many(to_status, [
+            (User(pk=staff_id), pk, {'from': from_status, 'date_time': str(date_time), 'by': 'sweeper'})
+            for pk, _, staff_id, date_time in rows
+        ], inline=True)
+        staff_ids = {staff_id for _, _, staff_id, _ in rows}
+        transaction.on_commit(lambda: _invalidate_counts(staff_ids))
+        versions.bump(*staff_ids, *{student_id for _, student_id, _, _ in rows})
+    return ids[-1], len(rows)
+
+
+def sweep(now=None, chunk_size=SWEEP_CHUNK_SIZE, dry_run=False):
+    """
+    Apply SWEEP_RULES to every appointment that ended more than
+    SWEEP_GRACE before `now`. Yields (from, to, rows) after each chunk.
+    With `dry_run`, yields one (from, to, count) per rule instead.
+    """
+    now = now or timezone.now()
+    cutoff = now - SWEEP_GRACE - timedelta(minutes=SLOT_MINUTES)
+    for from_status, to_status in SWEEP_RULES:
+        if dry_run:
+            overdue = Appointment.objects.filter(status=from_status, date_time__lt=cutoff)
+            yield from_status, to_status, overdue.count()
+            continue
+        after_id = 0
+        while True:
+            after_id, changed = _sweep_chunk(from_status, to_status, cutoff, after_id, chunk_size)
+            if after_id is None:
+                break
+            yield from_status, to_status, changed
@@ -0,0 +1,485 @@
+# appointments/tests.py
+
+import time
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .forms import StudentSignUpForm
+from . import audit, availability, booking, dashboards, pagination, sweeper, usernames, utils
+from .models import Appointment, AuditLog, ImportJob, MedicalTestSchedule, Profile
+
+User = get_user_model()
+
+
+def make_user(username, role):
+    user = User.objects.create_user(username)  # no password: tests log in with force_login
+    user.profile.role = role
+    user.profile.save()
+    return user
+
+
+class CacheClearingTestCase(TestCase):
+    """
+    Roles, versions and pages live in the cache, which outlives the test
+    database's rollbacks; start every test from an empty one.
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+class QueryCountHeaderTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff   = make_user('doc', 'staff')
+        self.student = make_user('stud', 'student')
+        for i in range(3):
+            Appointment.objects.create(
+                student=self.student, staff=self.staff,
+                date_time=timezone.now() + timedelta(days=1, minutes=30 * i),
+            )
+
+    def test_sync_view_counts_queries(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/dashboard/', follow=True)
+        self.assertGreater(int(response['X-Query-Count']), 0)
+
+    async def test_async_view_counts_queries_run_in_threads(self):
+        await sync_to_async(self.client.force_login)(self.staff)
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get('/staff/requests/')
+        self.assertEqual(response.status_code, 200)
+        # session, user and the dashboard's own queries, all run by
+        # sync_to_async threads rather than the event loop's
+        self.assertGreater(int(response['X-Query-Count']), 2)
+
+    async def test_async_dashboards_report_queries_on_miss_and_hit(self):
+        await sync_to_async(self.client.force_login)(self.student)
+        await sync_to_async(self.client.get)('/accounts/login/')  # sets the CSRF cookie
+        self.async_client.cookies = self.client.cookies
+        for path in ('/my-appointments/', '/medical-schedule/'):
+            with self.subTest(path=path):
+                miss = await self.async_client.get(path)
+                hit  = await self.async_client.get(path)
+                self.assertEqual((miss['X-Page-Cache'], hit['X-Page-Cache']), ('miss', 'hit'))
+                # a hit still loads the session and the user
+                self.assertGreater(int(hit['X-Query-Count']), 0)
+                self.assertGreater(int(miss['X-Query-Count']), int(hit['X-Query-Count']))
+
+
+class SweeperTests(CacheClearingTestCase):
+    def test_sweep_writes_audit_rows_with_each_chunk(self):
+        staff   = make_user('doc', 'staff')
+        student = make_user('stud', 'student')
+        past = timezone.now() - timedelta(days=1)
+        for i, status in enumerate(['pending', 'pending', 'confirmed']):
+            Appointment.objects.create(student=student, staff=staff, status=status,
+                                       date_time=past + timedelta(minutes=30 * i))
+
+        swept = sum(rows for _, _, rows in sweeper.sweep(chunk_size=2))
+
+        self.assertEqual(swept, 3)
+        # no flush(): the rows are written in the chunk's own transaction
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('kind', flat=True)),
+            ['attended', 'expired', 'expired'],
+        )
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('appointment_id', flat=True)),
+            sorted(Appointment.objects.values_list('id', flat=True)),
+        )
+
+    def test_audits_only_rows_the_update_changed(self):
+        staff   = make_user('doc', 'staff')
+        student = make_user('stud', 'student')
+        past = timezone.now() - timedelta(days=1)
+        kept, swept = [Appointment.objects.create(student=student, staff=staff, status='pending',
+                                                  date_time=past + timedelta(minutes=30 * i))
+                       for i in range(2)]
+        real_filter = Appointment.objects.filter
+
+        def filter_racing(*args, **kwargs):
+            # `kept` is confirmed by someone else between the SELECT and the UPDATE
+            if 'id__in' in kwargs and kwargs.get('status') == 'pending':
+                Appointment.objects.filter(pk=kept.pk).update(status='confirmed')
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(Appointment.objects, 'filter', side_effect=filter_racing):
+            changed = sweeper._sweep_chunk('pending', 'expired', timezone.now(), 0, 10)
+
+        self.assertEqual(changed, (swept.pk, 1))
+        self.assertEqual(list(AuditLog.objects.values_list('appointment_id', flat=True)), [swept.pk])
+
+
+class BufferedSinkTests(TransactionTestCase):
+    def setUp(self):
+        self.user = make_user('doc', 'staff')
+
+    def _entry(self, user_id, appointment_id):
+        return audit._entry(User(pk=user_id), 'other', appointment_id, None, timezone.now())
+
+    def test_idle_buffer_is_flushed_by_age(self):
+        sink = audit.BufferedSink(max_entries=100, max_age=0.1)
+        sink._append([self._entry(self.user.pk, 1)])
+        deadline = time.monotonic() + 5
+        while not AuditLog.objects.exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_bad_entry_does_not_drop_the_batch(self):
+        sink = audit.BufferedSink(max_entries=100, max_age=60)
+        entries = [self._entry(self.user.pk, 1), self._entry(self.user.pk + 1000, 2),
+                   self._entry(self.user.pk, 3)]
+        with self.assertLogs('appointments.audit', 'WARNING'):
+            sink._append(entries)
+            sink.flush()
+        self.assertEqual(sorted(AuditLog.objects.values_list('appointment_id', flat=True)), [1, 3])
+
+
+class ImportTransactionTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        # these tests commit, so the default sink buffers their audit
+        # entries; write them before the next test's tables are reset
+        self.addCleanup(audit.flush)
+        make_user('doc', 'staff')
+
+    def test_chunks_commit_as_they_go_and_hash_outside_transactions(self):
+        hashed_in_transaction = []
+        real_hash = utils._hash_passwords
+
+        def hash_passwords(raw):
+            hashed_in_transaction.append(connection.in_atomic_block)
+            return real_hash(raw)
+
+        seen = []
+
+        def progress(read):
+            seen.append((read, Profile.objects.filter(role='student').count(),
+                         connection.in_atomic_block))
+
+        roster = [{'name': f'Student {i}', 'matric_no': f'M{i}', 'department': 'CSC'} for i in range(5)]
+        with mock.patch.object(utils, '_hash_passwords', hash_passwords):
+            report = utils.allocate_medical_tests(roster, chunk_size=2, progress=progress)
+
+        self.assertEqual(report['created'], 5)
+        self.assertEqual(hashed_in_transaction, [False, False, False])
+        # each chunk is committed before the next one is read
+        self.assertEqual(seen, [(2, 2, False), (4, 4, False), (5, 5, False)])
+        self.assertEqual(MedicalTestSchedule.objects.count(), 5)
+
+    def test_interleaved_imports_never_share_a_slot(self):
+        other = [{'name': f'Other {i}', 'matric_no': f'O{i}', 'department': 'CSC'} for i in range(3)]
+
+        def progress(read):
+            # another import commits between this one's chunks
+            if read == 2:
+                utils.allocate_medical_tests(other)
+
+        roster = [{'name': f'Student {i}', 'matric_no': f'M{i}', 'department': 'CSC'} for i in range(4)]
+        utils.allocate_medical_tests(roster, chunk_size=2, progress=progress)
+
+        slots = list(MedicalTestSchedule.objects.values_list('staff_id', 'scheduled_date', 'scheduled_time'))
+        self.assertEqual(len(slots), 7)
+        self.assertEqual(len(set(slots)), 7)
+
+
+    def test_chunk_retries_when_a_signup_takes_its_username(self):
+        make_user('student', 'student')
+        real_highest = usernames._highest_suffixes
+        calls = []
+
+        def stale_highest(prefixes):
+            # the first allocation misses the user created "concurrently"
+            calls.append(prefixes)
+            return {} if len(calls) == 1 else real_highest(prefixes)
+
+        roster = [{'name': 'Student A', 'matric_no': 'M1', 'department': 'CSC'}]
+        with mock.patch.object(usernames, '_highest_suffixes', stale_highest):
+            report = utils.allocate_medical_tests(roster)
+
+        self.assertEqual(report['created'], 1)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Profile.objects.get(matric_no='M1').user.username, 'student1')
+        self.assertEqual(MedicalTestSchedule.objects.count(), 1)
+
+
+class ImportJobQueueTests(CacheClearingTestCase):
+    def test_stale_running_job_is_claimed_again(self):
+        long_ago = timezone.now() - utils.IMPORT_STALE_AFTER - timedelta(minutes=1)
+        stale = ImportJob.objects.create(csv_file='imports/a.csv', status='running',
+                                         worker='dead:1', started_at=long_ago, heartbeat_at=long_ago)
+        ImportJob.objects.create(csv_file='imports/b.csv', status='running', worker='alive:2',
+                                 started_at=long_ago, heartbeat_at=timezone.now())
+
+        job = utils.claim_next_import_job('new:3')
+
+        self.assertEqual((job.pk, job.status, job.worker), (stale.pk, 'running', 'new:3'))
+        self.assertIsNone(utils.claim_next_import_job('new:4'))
+
+    def test_requeued_job_ignores_its_old_worker(self):
+        job = ImportJob.objects.create(csv_file='imports/a.csv', status='running', worker='old:1')
+        ImportJob.objects.filter(pk=job.pk).update(worker='new:2')
+        with mock.patch.object(job.csv_file, 'open', side_effect=OSError('gone')):
+            with self.assertRaises(OSError):
+                utils.run_import_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), ('running', 'new:2'))
+
+
+class BookingBusyTests(CacheClearingTestCase):
+    def test_locked_database_is_reported_not_raised(self):
+        staff   = make_user('doc', 'staff')
+        student = make_user('stud', 'student')
+        slot = availability.next_free_slots(staff.pk, 1)[0]
+        with mock.patch.object(Appointment.objects, 'create',
+                               side_effect=OperationalError("database is locked")):
+            with self.assertLogs('appointments.booking', 'WARNING'):
+                result = booking.book_slot(student, staff, slot)
+        self.assertEqual((result.appointment, result.busy), (None, True))
+        self.assertFalse(Appointment.objects.exists())
+
+
+class SlotHoldTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = make_user('doc', 'staff')
+        self.alice = make_user('alice', 'student')
+        self.bob   = make_user('bob', 'student')
+        self.first, self.second = availability.next_free_slots(self.staff.pk, 2)
+
+    def test_new_hold_releases_the_previous_one(self):
+        token = booking.hold_slot(self.alice, self.staff.pk, self.first)
+        self.assertEqual(booking.hold_slot(self.alice, self.staff.pk, self.first), token)
+        self.assertIsNone(booking.hold_slot(self.bob, self.staff.pk, self.first))
+
+        self.assertIsNotNone(booking.hold_slot(self.alice, self.staff.pk, self.second))
+        # alice moved on, so her first pick is free again
+        self.assertIsNotNone(booking.hold_slot(self.bob, self.staff.pk, self.first))
+        self.assertIsNone(booking.hold_slot(self.bob, self.staff.pk, self.second))
+
+    def test_booking_releases_the_hold(self):
+        token = booking.hold_slot(self.alice, self.staff.pk, self.first)
+        result = booking.book_slot(self.alice, self.staff, self.first, hold_token=token)
+        self.assertIsNotNone(result.appointment)
+        self.assertIsNone(cache.get(booking._user_hold_key(self.alice.pk)))
+
+
+class TestSlotAvailabilityTests(CacheClearingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = make_user('doc', 'staff')
+        self.first, self.second = availability.next_free_slots(self.staff.pk, 2)
+
+    def _run_test_at(self, slot):
+        local = timezone.localtime(slot)
+        with self.captureOnCommitCallbacks(execute=True):
+            return MedicalTestSchedule.objects.create(
+                scheduled_date=local.date(), scheduled_time=local.time(),
+                staff=self.staff, ward_number='W1')
+
+    def test_medical_test_slot_is_not_offered(self):
+        self._run_test_at(self.first)
+        self.assertFalse(availability.is_slot_free(self.staff.pk, self.first))
+        self.assertNotIn(self.first, availability.next_free_slots(self.staff.pk, 2))
+
+    def test_moving_a_test_slot_frees_the_old_one(self):
+        test = MedicalTestSchedule.objects.get(pk=self._run_test_at(self.first).pk)
+        local = timezone.localtime(self.second)
+        test.scheduled_date, test.scheduled_time = local.date(), local.time()
+        with self.captureOnCommitCallbacks(execute=True):
+            test.save()
+        self.assertTrue(availability.is_slot_free(self.staff.pk, self.first))
+        self.assertFalse(availability.is_slot_free(self.staff.pk, self.second))
+
+
+class DashboardQueryCountTests(CacheClearingTestCase):
+    """
+    The dashboards load in a fixed number of queries whatever the number
+    of rows: session, user, role, then one per list (and the staff
+    counts).
+    """
+    def setUp(self):
+        super().setUp()
+        self.staff   = make_user('doc', 'staff')
+        self.student = make_user('stud', 'student')
+
+    def _grow_to(self, n):
+        start = timezone.now() + timedelta(days=1)
+        have  = Appointment.objects.count()
+        for i in range(have, n):
+            Appointment.objects.create(
+                student=self.student, staff=self.staff, date_time=start + timedelta(minutes=30 * i),
+                status='confirmed' if i % 2 else 'pending',
+            )
+            other = make_user(f'slot{i}', 'student')
+            MedicalTestSchedule.objects.create(
+                student=other.profile, staff=self.staff, ward_number='W1',
+                scheduled_date=start.date() + timedelta(days=i), scheduled_time='09:00',
+            )
+        cache.clear()
+
+    def test_staff_dashboard_queries_do_not_grow_with_rows(self):
+        self.client.force_login(self.staff)
+        for size in (2, 40):
+            self._grow_to(size)
+            with self.subTest(size=size), self.assertNumQueries(7):
+                self.assertEqual(self.client.get('/staff/requests/').status_code, 200)
+
+    def test_student_dashboard_queries_do_not_grow_with_rows(self):
+        self.client.force_login(self.student)
+        for size in (2, 40):
+            self._grow_to(size)
+            with self.subTest(size=size), self.assertNumQueries(5):
+                self.assertEqual(self.client.get('/my-appointments/').status_code, 200)
+
+
+class QueryPlanTests(CacheClearingTestCase):
+    """
+    Every dashboard query is served from an index; run
+    `manage.py explain_dashboards --seed N` for the same check at scale.
+    """
+    def test_dashboard_queries_do_not_scan_tables(self):
+        staff    = [make_user(f'doc{i}', 'staff') for i in range(3)]
+        students = [make_user(f'stud{i}', 'student') for i in range(30)]
+        start = timezone.now() - timedelta(days=30)
+        statuses = ('pending', 'confirmed', 'attended', 'cancelled', 'no_show', 'rejected')
+        Appointment.objects.bulk_create(
+            Appointment(student=students[i % 30], staff=staff[i % 3],
+                        date_time=start + timedelta(minutes=30 * i), status=statuses[i % 6])
+            for i in range(600)
+        )
+        MedicalTestSchedule.objects.bulk_create(
+            MedicalTestSchedule(student=student.profile, staff=staff[i % 3],
+                                scheduled_date=start.date() + timedelta(days=i),
+                                scheduled_time=start.time(), ward_number='W1')
+            for i, student in enumerate(students)
+        )
+        AuditLog.objects.bulk_create(AuditLog(user=students[i % 30], action='Seeded') for i in range(600))
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        for name, plan in dashboards.query_plans(staff[0], students[0]):
+            with self.subTest(query=name):
+                self.assertIsNone(dashboards.TABLE_SCAN.search(plan), plan)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ProfileWriteQueryCountTests(CacheClearingTestCase):
+    def _signup(self, full_name, matric_no):
+        form = StudentSignUpForm(data={
+            'full_name': full_name, 'matric_no': matric_no, 'department': 'CPT',
+            'password1': 'a-long-pass', 'password2': 'a-long-pass',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        return form.save()
+
+    def test_signup_queries_do_not_depend_on_name_collisions(self):
+        # one username lookup, then the User and Profile INSERTs and the
+        # UPDATE of the signup fields inside two savepoints (the collision
+        # retry's and create_user's)
+        for i, expected in enumerate(['ada', 'ada1', 'ada2']):
+            with self.subTest(username=expected), self.assertNumQueries(8):
+                user = self._signup(f'Ada Number{i}', f'M{i}')
+            self.assertEqual(user.username, expected)
+            self.assertEqual(user.profile.matric_no, f'M{i}')
+
+    def test_login_does_not_write_the_profile(self):
+        User.objects.create_user('grace', password='pw')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/accounts/login/', {'username': 'grace', 'password': 'pw'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse([q['sql'] for q in queries if 'appointments_profile' in q['sql']])
+
+    def test_import_queries_do_not_grow_with_the_roster(self):
+        make_user('doc', 'staff')
+        for size in (3, 30):
+            roster = [{'name': f'Imported {size} {i}', 'matric_no': f'I{size}-{i}', 'department': 'CSC'}
+                      for i in range(size)]
+            with self.subTest(size=size), self.assertNumQueries(14):
+                report = utils.allocate_medical_tests(roster)
+            self.assertEqual(report['created'], size)
+
+
+class DecideAppointmentsTests(CacheClearingTestCase):
+    def test_bulk_confirm_locks_appointments_only(self):
+        staff   = make_user('doc', 'staff')
+        student = make_user('stud', 'student')
+        start = timezone.now() + timedelta(days=1)
+        ids = [Appointment.objects.create(student=student, staff=staff,
+                                          date_time=start + timedelta(minutes=30 * i)).pk
+               for i in range(3)]
+
+        with CaptureQueriesContext(connection) as queries:
+            changed = booking.decide_appointments(staff, ids[:2], 'confirm')
+
+        self.assertEqual(changed, 2)
+        self.assertEqual(
+            list(Appointment.objects.order_by('id').values_list('status', flat=True)),
+            ['confirmed', 'confirmed', 'pending'],
+        )
+        # the (locking) appointment SELECT has no join to auth_user
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertIn('FROM "appointments_appointment"', selects[0])
+        self.assertNotIn('auth_user', selects[0])
+
+    def test_confirming_a_cancelled_request_whose_slot_was_rebooked(self):
+        staff = make_user('doc', 'staff')
+        alice = make_user('alice', 'student')
+        bob   = make_user('bob', 'student')
+        slot  = timezone.now() + timedelta(days=1)
+        cancelled = Appointment.objects.create(student=alice, staff=staff, date_time=slot,
+                                               status='cancelled')
+        Appointment.objects.create(student=bob, staff=staff, date_time=slot)
+
+        self.client.force_login(staff)
+        response = self.client.post(f'/staff/confirm/{cancelled.pk}/', {'action': 'confirm'})
+
+        self.assertRedirects(response, '/staff/requests/', fetch_redirect_response=False)
+        cancelled.refresh_from_db()
+        self.assertEqual(cancelled.status, 'cancelled')
+
+
+class CursorTests(CacheClearingTestCase):
+    def test_well_formed_cursor_with_wrong_types_is_a_client_error(self):
+        student = make_user('stud', 'student')
+        self.client.force_login(student)
+        for values in ([{'a': 1}, 1], ['2026-01-01T09:00:00+00:00', '7'], ['x', True], []):
+            cursor = pagination.encode_cursor(values)
+            with self.subTest(values=values):
+                with self.assertRaises(ValueError):
+                    pagination.decode_cursor(cursor)
+                self.assertEqual(self.client.get('/more/appointments/', {'cursor': cursor}).status_code, 400)
+                self.assertEqual(
+                    self.client.get('/api/v1/appointments/', {'cursor': cursor}).status_code, 400
+                )
+
+    def test_cursor_round_trip(self):
+        cursor = pagination.encode_cursor([timezone.now(), 5])
+        self.assertEqual(len(pagination.decode_cursor(cursor)), 2)
+
+
+class StaffCountsInvalidationTests(CacheClearingTestCase):
+    def test_counts_are_dropped_only_after_commit(self):
+        staff   = make_user('doc', 'staff')
+        student = make_user('stud', 'student')
+        self.assertEqual(dashboards.staff_counts(staff.pk)['pending'], 0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Appointment.objects.create(student=student, staff=staff,
+                                       date_time=timezone.now() + timedelta(days=1))
+            # still cached while the transaction is open
+            self.assertIsNotNone(cache.get(dashboards._counts_key(staff.pk)))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(dashboards.staff_counts(staff.pk)['pending'], 1)
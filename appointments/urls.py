@@ -7,9 +7,16 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('book/', views.book_appointment, name='book_appointment'),
+    path('book/slots/', views.free_slots, name='free_slots'),
+    path('book/hold/', views.hold_slot, name='hold_slot'),
     path('my-appointments/', views.my_appointments, name='my_appointments'),
     path('cancel/<int:appointment_id>/', views.cancel_appointment, name='cancel_appointment'),
     path('staff/requests/', views.staff_requests, name='staff_requests'),
     path('staff/confirm/<int:appointment_id>/', views.confirm_appointment, name='confirm_appointment'),
+    path('staff/decide/', views.decide_appointments, name='decide_appointments'),
     path('medical-schedule/', views.my_medical_schedule, name='my_medical_schedule'),
+    path('more/<str:list_name>/', views.load_more, name='load_more'),
+    path('calendar/<str:token>.ics', views.calendar_feed, name='calendar_feed'),
+    path('staff/perf/', views.perf_stats, name='perf_stats'),
+    path('metrics', views.metrics, name='metrics'),
 ]
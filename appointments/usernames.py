@@ -0,0 +1,98 @@
+# appointments/usernames.py
+"""
+Username allocation, shared by signup and roster imports. A username is
+the normalized first name, or that name plus the next numeric suffix when
+it is taken ("john", "john1", "john2", ...).
+
+The highest suffix in use is found with one prefix (LIKE 'john%') query,
+which the username index serves, instead of probing john1, john2, ...
+one query at a time. The unique constraint on User.username settles
+races between concurrent signups; save_with_unique_username retries
+with a fresh allocation when it loses one.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+User = get_user_model()
+
+# how many prefixes go into a single OR'd startswith lookup
+# (keeps the WHERE clause well below SQLite's expression-depth limit)
+PREFIX_LOOKUP_BATCH = 200
+
+SAVE_ATTEMPTS = 5
+
+
+def normalize(base):
+    return base.lower().replace(" ", "")
+
+
+def _highest_suffixes(prefixes):
+    """
+    {prefix: highest suffix in use}, where a bare `prefix` counts as 0,
+    for the prefixes that are taken at all. One query per
+    PREFIX_LOOKUP_BATCH prefixes.
+    """
+    prefixes = sorted(set(prefixes))
+    highest = {}
+    for i in range(0, len(prefixes), PREFIX_LOOKUP_BATCH):
+        batch = prefixes[i:i + PREFIX_LOOKUP_BATCH]
+        lookup = Q()
+        for prefix in batch:
+            lookup |= Q(username__startswith=prefix)
+        # "john" also matches "johnny7", so only a bare prefix or prefix
+        # plus digits counts, checked against every prefix in the batch
+        for username in User.objects.filter(lookup).values_list('username', flat=True):
+            for prefix in batch:
+                if username.startswith(prefix):
+                    rest = username[len(prefix):]
+                    if rest == '' or (rest.isdigit() and rest[0] != '0'):
+                        suffix = int(rest or 0)
+                        if suffix >= highest.get(prefix, -1):
+                            highest[prefix] = suffix
+    return highest
+
+
+def allocate_many(bases):
+    """
+    A distinct free username for each of `bases`, in order, resolving
+    collisions with existing users and within `bases` itself.
+    """
+    unames = [normalize(b) for b in bases]
+    highest = _highest_suffixes(unames)
+    assigned = set()
+    result = []
+    for uname in unames:
+        n = highest.get(uname, -1)
+        while True:
+            n += 1
+            trial = f"{uname}{n}" if n else uname
+            # "john" + 1 and a base of "john1" can meet inside one batch
+            if trial not in assigned:
+                break
+        highest[uname] = n
+        assigned.add(trial)
+        result.append(trial)
+    return result
+
+
+def allocate(base):
+    return allocate_many([base])[0]
+
+
+def save_with_unique_username(user, base, save):
+    """
+    Give the unsaved `user` a username allocated from `base` and store it
+    with `save(user)`. If a concurrent signup claims the same name first,
+    allocate again; any other IntegrityError is raised as usual.
+    """
+    for attempt in range(SAVE_ATTEMPTS):
+        user.username = allocate(base)
+        try:
+            with transaction.atomic():
+                return save(user)
+        except IntegrityError:
+            user.pk = None
+            if attempt == SAVE_ATTEMPTS - 1 or not User.objects.filter(username=user.username).exists():
+                raise
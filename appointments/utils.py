@@ -1,104 +1,330 @@
 # appointments/utils.py
 
+import codecs
+import csv
+import io
 import itertools
-from datetime import timedelta, time
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import chardet
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from django.db.utils import IntegrityError
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
 
-from .models import MedicalTestSchedule, Profile
+from . import availability, usernames, versions
+from .database import lock_timetable
+from .models import ImportJob, MedicalTestSchedule, Profile
+from .scheduling import get_scheduler, load_problem
 
 User = get_user_model()
 
-def _make_unique_username(base):
+# rows written per transaction by allocate_medical_tests
+ALLOCATION_CHUNK_SIZE = 500
+
+# a running ImportJob whose heartbeat is older than this lost its worker
+IMPORT_STALE_AFTER = timedelta(minutes=15)
+
+# bytes sniffed from the start of an upload to guess its encoding
+CSV_SNIFF_BYTES = 64 * 1024
+
+
+def _hash_passwords(raw_passwords):
     """
-    Normalize a candidate username and, if taken, append a counter.
+    Hash a batch of passwords in parallel. The PBKDF2 work happens in
+    hashlib, which releases the GIL, so threads give a real speed-up.
     """
-    uname = base.lower().replace(" ", "")
-    if not User.objects.filter(username=uname).exists():
-        return uname
-    # try uname1, uname2, … until we find a free one
-    for i in itertools.count(1):
-        trial = f"{uname}{i}"
-        if not User.objects.filter(username=trial).exists():
-            return trial
+    workers = min(len(raw_passwords), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(make_password, raw_passwords))
 
-def allocate_medical_tests(students_list):
+
+def detect_encoding(uploaded_file):
     """
-    students_list: list of dicts with keys 'name', 'matric_no', 'department'
-    
-    Steps:
-    1) get_or_create User(username=first_name) + Profile(role=student)
-    2) sync Profile.matric_no & Profile.department
-    3) assign sequential dates/times
-    4) rotate staff & wards
+    Guess the encoding of an uploaded file from its first CSV_SNIFF_BYTES
+    bytes, then rewind it.
     """
-    start_date   = timezone.localdate() + timedelta(days=1)
-    daily_slots  = [time(9,0), time(9,30), time(10,0), time(10,30),
-                    time(11,0), time(11,30), time(12,0)]
-    ward_numbers = [f"W{n}" for n in range(1, 11)]
+    uploaded_file.seek(0)
+    prefix = uploaded_file.read(CSV_SNIFF_BYTES)
+    uploaded_file.seek(0)
+    enc = chardet.detect(prefix).get('encoding') or 'utf-8'
+    # an all-ASCII prefix says nothing about the rest of the file
+    return 'utf-8' if enc.lower() == 'ascii' else enc
+
+
+def iter_csv_lines(uploaded_file):
+    """
+    Decode an uploaded file chunk by chunk and yield it line by line
+    (line endings kept, as csv.reader expects with newline=''), so only
+    one chunk is ever held in memory.
+    """
+    decoder = codecs.getincrementaldecoder(detect_encoding(uploaded_file))(errors='replace')
+    pending = ''
+    for chunk in uploaded_file.chunks():
+        pending += decoder.decode(chunk)
+        lines = io.StringIO(pending, newline='').readlines()
+        # hold back an unterminated line, or a '\r' that may be half of '\r\n'
+        if lines and (lines[-1][-1] not in '\r\n' or lines[-1].endswith('\r')):
+            pending = lines.pop()
+        else:
+            pending = ''
+        yield from lines
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield from io.StringIO(pending, newline='').readlines()
+
+
+def _parse_student_row(row):
+    """
+    Pull (name, matric_no, department) out of a CSV row, or None if the
+    row is missing a name or matric number.
+    """
+    name      = (row.get("name") or row.get("full name") or "").strip()
+    matric_no = (row.get("matric_no") or row.get("matric no") or "").strip()
+    dept      = (row.get("department") or row.get("dept") or "").strip()
+
+    if not (name and matric_no):
+        return None
+    return name, matric_no, dept
 
-    staff_cycle = itertools.cycle(
-        User.objects.filter(profile__role="staff")
-    )
-    slot_cycle = itertools.cycle(daily_slots)
-    ward_cycle = itertools.cycle(ward_numbers)
 
-    current_date = start_date
+def _schedule(profiles, slots):
+    schedules = []
+    for profile, (scheduled_date, scheduled_time, staff_id, ward) in zip(profiles, slots):
+        schedules.append(MedicalTestSchedule(
+            student        = profile,
+            scheduled_date = scheduled_date,
+            scheduled_time = scheduled_time,
+            staff_id       = staff_id,
+            ward_number    = ward,
+        ))
+    MedicalTestSchedule.objects.bulk_create(schedules)
+    # bulk_create sends no signals, so the API caches are told here
+    versions.bump(*{sched.staff_id for sched in schedules}, *{p.user_id for p in profiles})
+    staff_days = [(sched.staff_id, sched.scheduled_date) for sched in schedules]
+    transaction.on_commit(lambda: availability.forget_days(staff_days))
+
+
+def _create_students(rows, unames, passwords, slots):
+    """
+    Create Users, Profiles and MedicalTestSchedules for new students
+    using a fixed number of queries. `passwords` are already hashed.
+    """
+    # bulk_create skips the post_save signals, so Profiles are created here
+    users = User.objects.bulk_create([
+        User(username=uname, first_name=name, password=password)
+        for uname, (name, _, _), password in zip(unames, rows, passwords)
+    ])
+    if any(u.pk is None for u in users):
+        # backends that can't return ids from a bulk insert
+        ids = dict(User.objects.filter(username__in=unames).values_list("username", "id"))
+        for u in users:
+            u.pk = ids[u.username]
+
+    profiles = Profile.objects.bulk_create([
+        Profile(user=user, role="student", matric_no=matric_no, department=dept)
+        for user, (_, matric_no, dept) in zip(users, rows)
+    ])
+    if any(p.pk is None for p in profiles):
+        ids = dict(Profile.objects.filter(user__in=users).values_list("user_id", "id"))
+        for p in profiles:
+            p.pk = ids[p.user_id]
 
-    for row in students_list:
-        name      = (row.get("name") or row.get("full name") or "").strip()
-        matric_no = (row.get("matric_no") or row.get("matric no") or "").strip()
-        dept      = (row.get("department") or row.get("dept") or "").strip()
+    _schedule(profiles, slots)
 
-        if not (name and matric_no):
+
+def _diff_chunk(rows, seen, report):
+    """
+    Compare one chunk of parsed rows with the existing profiles (one
+    query, keyed by matric_no). Returns (new rows, profiles whose
+    department changed, profiles without a slot).
+    """
+    existing = {
+        p.matric_no: p
+        for p in Profile.objects.filter(
+            matric_no__in=[matric_no for _, matric_no, _ in rows]
+        ).annotate(
+            has_schedule=Exists(MedicalTestSchedule.objects.filter(student=OuterRef('pk')))
+        )
+    }
+
+    new, changed, unscheduled = [], [], []
+    for row in rows:
+        _, matric_no, dept = row
+        if matric_no in seen:
+            report['duplicate'] += 1
             continue
+        seen.add(matric_no)
+
+        profile = existing.get(matric_no)
+        if profile is None:
+            new.append(row)
+            continue
+        touched = False
+        if (profile.department or "") != dept:
+            profile.department = dept
+            changed.append(profile)
+            touched = True
+        if not profile.has_schedule:
+            unscheduled.append(profile)
+            touched = True
+        if not touched:
+            report['unchanged'] += 1
+
+    report['created']   += len(new)
+    report['updated']   += len(changed)
+    report['scheduled'] += len(unscheduled)
+    return new, changed, unscheduled
 
-        # --- 1) create or get User with first-name login ---
-        first = name.split()[0]
-        uname = _make_unique_username(first)
+
+def _write_chunk(new, changed, unscheduled):
+    """
+    Write one chunk's difference. Password hashing, the slow part, runs
+    before the transaction opens. Slots are drawn inside it, under the
+    timetable lock and from occupancy read afresh, so imports running at
+    the same time never hand out the same slot.
+
+    A signup can claim one of the chunk's usernames before it commits;
+    as in usernames.save_with_unique_username, the chunk is then rolled
+    back and written again with a fresh allocation.
+    """
+    passwords = _hash_passwords([matric_no for _, matric_no, _ in new]) if new else []
+    for attempt in range(usernames.SAVE_ATTEMPTS):
+        unames = []
         try:
-            user, created = User.objects.get_or_create(
-                username=uname,
-                defaults={"first_name": name}
-            )
+            with transaction.atomic():
+                slots = []
+                if new or unscheduled:
+                    lock_timetable()
+                    slots = list(itertools.islice(get_scheduler(load_problem()).slots(),
+                                                  len(new) + len(unscheduled)))
+                if new:
+                    unames = usernames.allocate_many([name.split()[0] for name, _, _ in new])
+                    _create_students(new, unames, passwords, slots[:len(new)])
+                if changed:
+                    Profile.objects.bulk_update(changed, ['department'])
+                    # the department shows in staff members' test-slot lists
+                    versions.bump(*MedicalTestSchedule.objects.filter(student__in=changed)
+                                  .values_list('staff_id', flat=True).distinct())
+                if unscheduled:
+                    _schedule(unscheduled, slots[len(new):])
+            return
         except IntegrityError:
-            # rare race condition: regenerate
-            uname = _make_unique_username(first)
-            user, created = User.objects.get_or_create(
-                username=uname,
-                defaults={"first_name": name}
-            )
+            if attempt == usernames.SAVE_ATTEMPTS - 1 or not User.objects.filter(username__in=unames).exists():
+                raise
 
-        if created:
-            user.set_password(matric_no)
-            user.save()
 
-        # --- 2) sync Profile ---
-        profile, _ = Profile.objects.get_or_create(
-            user=user,
-            defaults={"role": "student"}
-        )
-        changed = False
-        if profile.matric_no != matric_no:
-            profile.matric_no = matric_no
-            changed = True
-        if profile.department != dept:
-            profile.department = dept
-            changed = True
-        if changed:
-            profile.save()
+def allocate_medical_tests(students_list, chunk_size=ALLOCATION_CHUNK_SIZE, progress=None,
+                           dry_run=False):
+    """
+    students_list: iterable of dicts with keys 'name', 'matric_no', 'department'
 
-        # --- 3) pick next slot & bump date when wrapping ---
-        slot = next(slot_cycle)
-        if slot == daily_slots[0]:
-            current_date += timedelta(days=1)
+    Syncs the roster with the database, keyed by Profile.matric_no:
+    1) unknown matric_no: create User(username=first_name) +
+       Profile(role=student) and give them a slot
+    2) known matric_no with a different department: update the Profile
+    3) known student without a MedicalTestSchedule: give them a slot
+    4) anything else is left alone, so re-importing a roster is a no-op
 
-        # --- 4) create the MedicalTestSchedule ---
-        MedicalTestSchedule.objects.create(
-            student        = profile,
-            scheduled_date = current_date,
-            scheduled_time = slot,
-            staff          = next(staff_cycle),
-            ward_number    = next(ward_cycle),
+    Slots (date, time, staff, ward) come from the configured scheduler,
+    see appointments.scheduling, re-run for each chunk under the
+    timetable lock (appointments.database.lock_timetable). Rows are diffed and written in chunks of
+    `chunk_size` with bulk queries, one short transaction per chunk so
+    that bookings are not locked out for the length of the import. A
+    failure keeps the chunks already committed; since unchanged rows are
+    skipped, importing the same roster again finishes the job. With
+    `dry_run` nothing is written. If given, `progress` is called with
+    the number of rows read after every chunk.
+
+    Returns a Counter report with the keys created, updated, scheduled,
+    unchanged, duplicate (matric_no repeated in the roster) and invalid
+    (missing name or matric_no).
+    """
+    report = Counter()
+    seen = set()
+    rows = iter(students_list)
+    read = 0
+
+    while True:
+        batch = list(itertools.islice(rows, chunk_size))
+        if not batch:
+            break
+        read += len(batch)
+        chunk = list(filter(None, map(_parse_student_row, batch)))
+        report['invalid'] += len(batch) - len(chunk)
+        if chunk:
+            new, changed, unscheduled = _diff_chunk(chunk, seen, report)
+            if not dry_run and (new or changed or unscheduled):
+                _write_chunk(new, changed, unscheduled)
+        if progress:
+            progress(read)
+    return report
+
+
+def requeue_stale_import_jobs():
+    """
+    Put 'running' jobs whose worker died (no heartbeat for
+    IMPORT_STALE_AFTER) back in the queue. Committed chunks are skipped
+    as unchanged when the job runs again. Returns how many were requeued.
+    """
+    cutoff = timezone.now() - IMPORT_STALE_AFTER
+    return ImportJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status='running',
+    ).update(status='queued', worker='')
+
+
+def claim_next_import_job(worker):
+    """
+    Atomically move the oldest queued ImportJob to 'running' for `worker`,
+    after requeueing stale ones. The conditional UPDATE makes sure only
+    one worker wins each job. Returns the claimed job, or None if the
+    queue is empty.
+    """
+    requeue_stale_import_jobs()
+    while True:
+        job_id = (ImportJob.objects.filter(status='queued')
+                  .order_by('created_at', 'id')
+                  .values_list('id', flat=True)
+                  .first())
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(id=job_id, status='queued').update(
+            status='running', worker=worker, started_at=now, heartbeat_at=now
         )
+        if claimed:
+            return ImportJob.objects.get(id=job_id)
+        # another worker got there first; try the next one
+
+
+def run_import_job(job):
+    """
+    Stream a claimed job's CSV into allocate_medical_tests and record the
+    outcome on the job row. Chunks commit as they go, so the live row
+    count is written to the job row too, where the admin (in another
+    process) can read it, along with a heartbeat. Updates only apply
+    while this worker still owns the job, i.e. it wasn't requeued.
+    """
+    owned = ImportJob.objects.filter(id=job.id, worker=job.worker)
+
+    def progress(rows):
+        owned.update(rows_processed=rows, heartbeat_at=timezone.now())
+
+    try:
+        with job.csv_file.open('rb') as f:
+            report = allocate_medical_tests(
+                csv.DictReader(iter_csv_lines(f)), progress=progress, dry_run=job.dry_run
+            )
+    except Exception as e:
+        owned.update(status='failed', error=str(e), finished_at=timezone.now())
+        raise
+    owned.update(
+        status='done',
+        rows_processed=sum(report.values()),
+        report=dict(report),
+        finished_at=timezone.now(),
+    )
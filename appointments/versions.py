@@ -0,0 +1,62 @@
+# appointments/versions.py
+"""
+Per-user change counters. Anything that alters what a user would see in
+their appointment or medical-test lists bumps that user's version, so
+cached responses can be keyed on it and never need to be found and
+deleted: a bump simply makes the old keys unreachable.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_TIMEOUT = None  # counters don't expire on their own
+
+
+def _key(user_id):
+    return f"user-version:{user_id}"
+
+
+def _fresh():
+    # a lost counter restarts from the clock, never from a value that
+    # keys cached before it was lost could still carry
+    return time.time_ns() // 1000
+
+
+def user_version(user_id):
+    key = _key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _fresh()
+        if not cache.add(key, version, VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+async def auser_version(user_id):
+    key = _key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = _fresh()
+        if not await cache.aadd(key, version, VERSION_TIMEOUT):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump(*user_ids):
+    """
+    Move the given users to a new version once the current transaction
+    commits, so no one can cache the old data under the new version.
+    """
+    user_ids = {pk for pk in user_ids if pk is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _bump_now(user_ids))
+
+
+def _bump_now(user_ids):
+    for pk in user_ids:
+        try:
+            cache.incr(_key(pk))
+        except ValueError:
+            cache.set(_key(pk), _fresh(), VERSION_TIMEOUT)
@@ -1,14 +1,28 @@
 # appointments/views.py
 
-from django.contrib.auth import login
+import hmac
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import login, get_user_model
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.template.loader import render_to_string
 from django.contrib import messages
+from django.db import IntegrityError, transaction
 from django.utils import timezone
+from django.views.decorators.http import condition
 
 from .forms import StudentSignUpForm, BookAppointmentForm
-from .models import Appointment, AuditLog, MedicalTestSchedule
-from .decorators import role_required
+from .models import Appointment
+from .decorators import async_role_required, role_required
+from .pagecache import cache_page_per_user
+from . import audit, availability, booking, dashboards, ical, instrumentation, profiles
 
 
 def home(request):
@@ -35,7 +49,7 @@ def register(request):
 
 @login_required
 def dashboard(request):
-    role = request.user.profile.role
+    role = profiles.get_role(request.user)
     if role == 'student':
         return redirect('appointments:my_appointments')
     elif role == 'staff':
@@ -43,23 +57,16 @@ def dashboard(request):
     return redirect('appointments:home')
 
 
-@login_required
-@role_required('student')
-def my_appointments(request):
-    # 1) their regular clinic appointments
-    appointments = Appointment.objects.filter(
-        student=request.user
-    ).order_by('-date_time')
-
-    # 2) their assigned medical-test slots via the Profile FK
-    medical_tests = MedicalTestSchedule.objects.filter(
-        student=request.user.profile
-    ).order_by('scheduled_date', 'scheduled_time')
-
-    return render(request, 'appointments/dashboard_student.html', {
-        'appointments':  appointments,
-        'medical_tests': medical_tests,
-    })
+# The dashboards are the busiest pages, so they are async views: under
+# ASGI their queries don't tie up a worker thread each. Templates still
+# render through sync_to_async, since context processors touch the session.
+# Repeat views come from the per-user page cache (appointments/pagecache.py).
+@async_role_required('student')
+@cache_page_per_user
+async def my_appointments(request):
+    context = await dashboards.astudent_dashboard(request.user)
+    context['calendar_url'] = _calendar_url(request)
+    return await sync_to_async(render)(request, 'appointments/dashboard_student.html', context)
 
 
 @login_required
@@ -68,28 +75,74 @@ def book_appointment(request):
     if request.method == 'POST':
         form = BookAppointmentForm(request.POST)
         if form.is_valid():
-            appt = form.save(commit=False)
-            appt.student = request.user
-            appt.status = 'pending'
-            appt.save()
-            AuditLog.objects.create(
-                user=request.user,
-                action=f"Booked appointment {appt.id}",
-                details={
-                    'staff': appt.staff.username,
-                    'date_time': str(appt.date_time)
-                }
+            result = booking.book_slot(
+                request.user,
+                form.cleaned_data['staff'],
+                form.cleaned_data['date_time'],
+                form.cleaned_data['reason_for_visit'],
+                hold_token=form.cleaned_data['hold_token'],
             )
-            messages.success(request,
-                "Appointment request submitted. Please wait for staff approval."
-            )
-            return redirect('appointments:my_appointments')
+            if result.appointment:
+                messages.success(request,
+                    "Appointment request submitted. Please wait for staff approval."
+                )
+                return redirect('appointments:my_appointments')
+            if result.busy:
+                form.add_error(None, "The booking system is busy right now. Please try again in a moment.")
+                return render(request, 'appointments/book_appointment.html', {'form': form})
+            form.add_error('date_time', "Sorry, that slot was just taken. Please pick another.")
+            form.fields['date_time'].widget.choices = [
+                (availability.format_slot(slot), availability.label_slot(slot))
+                for slot in result.alternatives
+            ]
     else:
         form = BookAppointmentForm()
 
     return render(request, 'appointments/book_appointment.html', {'form': form})
 
 
+@login_required
+@role_required('student')
+def free_slots(request):
+    """
+    JSON list of the next free slots for ?staff=<id> (at most ?n=, capped
+    at 50), used by the booking form's slot picker.
+    """
+    staff_id = request.GET.get('staff', '')
+    n = request.GET.get('n', '10')
+    if not (staff_id.isdigit() and n.isdigit()):
+        return JsonResponse({'error': 'staff and n must be integers'}, status=400)
+    staff = get_object_or_404(get_user_model(), pk=staff_id, profile__role='staff')
+    slots = availability.slot_choices(staff.pk, min(int(n), 50))
+    return JsonResponse({
+        'slots': [{'value': value, 'label': label} for value, label in slots],
+    })
+
+
+@login_required
+@role_required('student')
+def hold_slot(request):
+    """
+    POST staff + date_time to hold that slot while the form is filled in.
+    Returns the hold token, or 409 if another student is holding it.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    staff_id = request.POST.get('staff', '')
+    try:
+        dt = timezone.make_aware(
+            datetime.strptime(request.POST.get('date_time', ''), availability.SLOT_INPUT_FORMAT)
+        )
+    except ValueError:
+        dt = None
+    if not (staff_id.isdigit() and dt and availability.is_on_grid(dt)):
+        return JsonResponse({'error': 'staff and a valid date_time are required'}, status=400)
+    token = booking.hold_slot(request.user, int(staff_id), dt)
+    if token is None:
+        return JsonResponse({'error': 'slot is held by someone else'}, status=409)
+    return JsonResponse({'token': token, 'expires_in': booking.HOLD_SECONDS})
+
+
 @login_required
 @role_required('student')
 def cancel_appointment(request, appointment_id):
@@ -104,41 +157,22 @@ def cancel_appointment(request, appointment_id):
     else:
         appt.status = 'cancelled'
         appt.save()
-        AuditLog.objects.create(
+        audit.record(
             user=request.user,
-            action=f"Cancelled appointment {appt.id}",
+            kind='cancelled',
+            appointment_id=appt.id,
             details={'date_time': str(appt.date_time)}
         )
         messages.success(request, "Appointment successfully cancelled.")
     return redirect('appointments:my_appointments')
 
 
-@login_required
-@role_required('staff')
-def staff_requests(request):
-    # 1) pending clinic appointments
-    pending = Appointment.objects.filter(
-        staff=request.user,
-        status='pending'
-    ).order_by('date_time')
-
-    # 2) confirmed upcoming appointments
-    confirmed = Appointment.objects.filter(
-        staff=request.user,
-        status='confirmed',
-        date_time__gte=timezone.now()
-    ).order_by('date_time')
-
-    # 3) this staff’s medical-test slots
-    test_slots = MedicalTestSchedule.objects.filter(
-        staff=request.user
-    ).order_by('scheduled_date', 'scheduled_time')
-
-    return render(request, 'appointments/dashboard_staff.html', {
-        'pending_appointments':   pending,
-        'confirmed_appointments': confirmed,
-        'test_slots':             test_slots,
-    })
+@async_role_required('staff')
+@cache_page_per_user
+async def staff_requests(request):
+    context = await dashboards.astaff_dashboard(request.user)
+    context['calendar_url'] = _calendar_url(request)
+    return await sync_to_async(render)(request, 'appointments/dashboard_staff.html', context)
 
 
 @login_required
@@ -149,30 +183,31 @@ def confirm_appointment(request, appointment_id):
                              staff=request.user)
     if request.method == 'POST':
         action = request.POST.get('action')
-        if action == 'confirm':
-            appt.status = 'confirmed'
-            appt.save()
-            AuditLog.objects.create(
-                user=request.user,
-                action=f"Confirmed appointment {appt.id}",
-                details={
-                    'student': appt.student.username,
-                    'date_time': str(appt.date_time)
-                }
-            )
-            messages.success(request, "Appointment confirmed.")
-        elif action == 'reject':
-            appt.status = 'rejected'
-            appt.save()
-            AuditLog.objects.create(
-                user=request.user,
-                action=f"Rejected appointment {appt.id}",
-                details={
-                    'student': appt.student.username,
-                    'date_time': str(appt.date_time)
-                }
-            )
-            messages.success(request, "Appointment rejected.")
+        status = booking.DECISIONS.get(action)
+        if status is None:
+            return redirect('appointments:staff_requests')
+        if appt.status != 'pending':
+            # a cancelled or rejected request's slot may have been rebooked
+            messages.error(request, f"This request is already {appt.get_status_display().lower()}.")
+            return redirect('appointments:staff_requests')
+        appt.status = status
+        try:
+            with transaction.atomic():
+                appt.save()
+        except IntegrityError:
+            # cancelled meanwhile, and the slot taken by someone else
+            messages.error(request, "That slot has been booked by someone else in the meantime.")
+            return redirect('appointments:staff_requests')
+        audit.record(
+            user=request.user,
+            kind=status,
+            appointment_id=appt.id,
+            details={
+                'student': appt.student.username,
+                'date_time': str(appt.date_time)
+            }
+        )
+        messages.success(request, f"Appointment {status}.")
         return redirect('appointments:staff_requests')
 
     return render(request, 'appointments/confirm_appointment.html', {
@@ -180,18 +215,120 @@ def confirm_appointment(request, appointment_id):
     })
 
 
+@login_required
+@role_required('staff')
+def decide_appointments(request):
+    """
+    POST ids (repeated) and action=confirm|reject to decide many pending
+    requests at once from the staff dashboard.
+    """
+    if request.method != 'POST':
+        return redirect('appointments:staff_requests')
+    action = request.POST.get('action')
+    ids = [pk for pk in request.POST.getlist('ids') if pk.isdigit()]
+    if action not in booking.DECISIONS or not ids:
+        messages.error(request, "Select at least one request and an action.")
+    elif len(ids) > booking.MAX_BULK_DECISIONS:
+        messages.error(request,
+            f"At most {booking.MAX_BULK_DECISIONS} requests can be decided at once."
+        )
+    else:
+        changed = booking.decide_appointments(request.user, [int(pk) for pk in ids], action)
+        messages.success(request,
+            f"{booking.DECISIONS[action].capitalize()} {changed} appointment{'s' if changed != 1 else ''}."
+        )
+    return redirect('appointments:staff_requests')
+
+
 # ----------------------------------------------------------------
 # Dedicated “My Medical Schedule” page
-@login_required
-@role_required('student')
-def my_medical_schedule(request):
+@async_role_required('student')
+@cache_page_per_user
+async def my_medical_schedule(request):
     """
     Show the logged-in student their assigned medical test slots.
     """
-    medical_tests = MedicalTestSchedule.objects.filter(
-        student=request.user.profile
-    ).order_by('scheduled_date', 'scheduled_time')
+    return await sync_to_async(render)(request, 'appointments/my_medical_schedule.html', {
+        'medical_tests': await dashboards.apage('medical_tests', request.user),
+    })
 
-    return render(request, 'appointments/my_medical_schedule.html', {
-        'medical_tests': medical_tests,
+
+@login_required
+def load_more(request, list_name):
+    """
+    Next page of a dashboard list as JSON: the rendered rows plus the
+    cursor for the page after, fetched as the user scrolls.
+    """
+    spec = dashboards.LISTS.get(list_name)
+    if spec is None:
+        raise Http404
+    if profiles.get_role(request.user) != spec.role:
+        raise PermissionDenied
+    try:
+        page = dashboards.page(list_name, request.user, request.GET.get('cursor'))
+    except (ValueError, ValidationError):
+        return JsonResponse({'error': 'invalid cursor'}, status=400)
+    return JsonResponse({
+        'html': render_to_string(spec.template, {'rows': page.rows}, request),
+        'next': page.next,
     })
+
+
+def _calendar_url(request):
+    return request.build_absolute_uri(
+        reverse('appointments:calendar_feed', args=[ical.feed_token(request.user)])
+    )
+
+
+def _feed_user(request, token):
+    # resolved once, shared by the ETag check and the view
+    if not hasattr(request, '_feed_user'):
+        request._feed_user = ical.user_for_token(token)
+    return request._feed_user
+
+
+def _feed_etag(request, token):
+    user = _feed_user(request, token)
+    return ical.feed_etag(user) if user else None
+
+
+@condition(etag_func=_feed_etag)
+def calendar_feed(request, token):
+    """
+    The user's iCalendar feed, for subscribing from a calendar app. The
+    signed token in the URL stands in for a login; conditional GETs with
+    a matching ETag get a 304 without the feed being rendered.
+    """
+    user = _feed_user(request, token)
+    if user is None:
+        raise Http404
+    return HttpResponse(ical.render_feed(user, request.get_host()),
+                        content_type='text/calendar; charset=utf-8')
+
+
+@staff_member_required
+def perf_stats(request):
+    """
+    This process's per-view request statistics as JSON, for admins.
+    """
+    return JsonResponse({
+        'views': instrumentation.registry.snapshot(),
+        'counters': [
+            {'name': name, 'labels': labels, 'value': count}
+            for name, labels, count in instrumentation.registry.counters()
+        ],
+    })
+
+
+def metrics(request):
+    """
+    The same statistics in the Prometheus text format. Readable by admins,
+    or by a scraper sending `Authorization: Bearer <PERF_METRICS_TOKEN>`.
+    """
+    token = getattr(settings, 'PERF_METRICS_TOKEN', '')
+    sent = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not (token and hmac.compare_digest(sent, token)) and not request.user.is_staff:
+        raise PermissionDenied
+    registry = instrumentation.registry
+    return HttpResponse(instrumentation.prometheus_text(registry.snapshot(), registry.counters()),
+                        content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,5 +1,10 @@
 import os
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'clinic_scheduler.settings')
 application = get_asgi_application()
+
+if getattr(settings, 'SERVE_STATIC', False):
+    application = ASGIStaticFilesHandler(application)
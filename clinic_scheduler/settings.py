@@ -17,10 +17,12 @@ INSTALLED_APPS = [
     'crispy_forms',
     'django_extensions',
     'rest_framework',
+    'rest_framework.authtoken',
     'appointments.apps.AppointmentsConfig',
 ]
 
 MIDDLEWARE = [
+    'appointments.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,7 +36,8 @@ ROOT_URLCONF = 'clinic_scheduler.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates with render timing for PerformanceMiddleware
+        'BACKEND': 'appointments.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -51,13 +54,77 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'clinic_scheduler.wsgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE=postgres switches to PostgreSQL (settings from POSTGRES_*);
+# the default is the SQLite file, tuned by appointments/database.py.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'clinic_scheduler'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # keep connections open between requests, but check them
+            # before reuse so a restarted server doesn't cause errors
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
     }
+else:
+    raise ValueError(f"DB_ENGINE must be 'sqlite' or 'postgres', not {DB_ENGINE!r}")
+
+# PRAGMAs applied to every new SQLite connection (appointments/database.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',      # readers no longer block on the writer
+    'synchronous': 'NORMAL',    # safe with WAL, one fsync per checkpoint
+    'busy_timeout': 20000,      # ms a writer waits for the lock before "database is locked"
+    'cache_size': -20000,       # negative means KiB, so ~20 MB per connection
 }
 
+# Cache holding the availability index, roles, per-user versions and the
+# cached API responses and dashboard pages. CACHE_BACKEND picks it:
+# 'locmem' (default) is per process, so as soon as anything else runs
+# beside the web server (the import worker, the sweeper, several uvicorn
+# workers) use 'file' (a directory they all share) or 'redis' (needs the
+# redis package). docker-entrypoint.sh defaults to 'file'.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', BASE_DIR / 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+elif CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+        }
+    }
+else:
+    raise ValueError(f"CACHE_BACKEND must be 'locmem', 'file' or 'redis', not {CACHE_BACKEND!r}")
+
+# Seconds a rendered dashboard stays cached (appointments/pagecache.py);
+# edits expire it sooner through the per-user version
+PAGE_CACHE_TIMEOUT = 120
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -76,8 +143,45 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded files (queued CSV imports)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
 
+# Read-only API (appointments/api.py): session auth for the browser,
+# tokens from /api/v1/auth-token/ for the mobile app
+REST_FRAMEWORK = {
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.URLPathVersioning',
+    'ALLOWED_VERSIONS': ['v1'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+
+# Request instrumentation (appointments/instrumentation.py): the share of
+# requests timed, samples kept per view, slowest queries kept per view,
+# and an optional bearer token letting a Prometheus scraper read /metrics
+PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', '1.0'))
+PERF_BUFFER_SIZE = 200
+PERF_SLOW_QUERIES = 5
+PERF_METRICS_TOKEN = os.environ.get('PERF_METRICS_TOKEN', '')
+
 LOGIN_URL = '/accounts/login/'
 LOGIN_REDIRECT_URL = 'appointments:dashboard'
 LOGOUT_REDIRECT_URL = 'login'
+
+# Medical-test timetabling engine used by CSV imports
+MEDICAL_TEST_SCHEDULER = 'appointments.scheduling.GreedyScheduler'
+
+# Audit trail: BufferedSink batches AuditLog writes per process,
+# InlineSink writes each entry immediately.
+AUDIT_SINK = 'appointments.audit.BufferedSink'
+AUDIT_BUFFER_SIZE = 100
+AUDIT_FLUSH_INTERVAL = 5.0  # seconds
+
+# Where `archive_audit_log` writes old months of AuditLog
+AUDIT_ARCHIVE_DIR = BASE_DIR / 'archive'
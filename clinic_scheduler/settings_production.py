@@ -0,0 +1,26 @@
+# clinic_scheduler/settings_production.py
+"""
+Production profile, used by the ASGI serving mode in docker-entrypoint.sh
+(SERVER_MODE=asgi). DEBUG is off, so Django no longer keeps every query
+in memory, and secrets and hosts come from the environment.
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+
+DEBUG = False
+# never fall back to the development key: it signs sessions and the
+# calendar feed tokens
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', '')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY for the production settings.")
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+# There is no separate web server in the container, so the ASGI app
+# serves collected static files itself (see clinic_scheduler/asgi.py).
+SERVE_STATIC = True
+
+SESSION_COOKIE_SECURE = os.environ.get('DJANGO_SECURE_COOKIES', '') == '1'
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
@@ -5,5 +5,6 @@ from django.views.generic import RedirectView
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
+    path('api/<str:version>/', include('appointments.api')),
     path('', include('appointments.urls')),
 ]
@@ -1,6 +1,22 @@
 #!/usr/bin/env bash
 set -e
 
+# SERVER_MODE=asgi serves the app with uvicorn and the production settings;
+# anything else keeps the development server.
+if [ "$SERVER_MODE" = "asgi" ]; then
+    export DJANGO_SETTINGS_MODULE=clinic_scheduler.settings_production
+fi
+
+# The web server, the import worker and the sweeper are separate processes
+# that must share one cache: the workers bump the user versions that key
+# cached pages and API responses, so a per-process locmem cache would
+# leave those stale.
+export CACHE_BACKEND="${CACHE_BACKEND:-file}"
+if [ "$CACHE_BACKEND" = "locmem" ]; then
+    echo "CACHE_BACKEND=locmem can't be shared between the server and its workers; use file or redis." >&2
+    exit 1
+fi
+
 # Apply any pending migrations
 python manage.py migrate
 
@@ -10,5 +26,16 @@ python manage.py migrate
 # User.objects.filter(username='admin').exists() or User.objects.create_superuser('admin','admin@example.com','adminpass')" \
 # | python manage.py shell
 
+# Process queued CSV imports in the background
+python manage.py run_import_worker &
+
+# Every 15 minutes, move finished appointments to attended / no_show
+python manage.py sweep_appointments --loop 900 &
+
 # Finally, launch the server on 0.0.0.0:8000
+if [ "$SERVER_MODE" = "asgi" ]; then
+    python manage.py collectstatic --noinput
+    exec uvicorn clinic_scheduler.asgi:application \
+        --host 0.0.0.0 --port 8000 --workers "${WEB_CONCURRENCY:-2}"
+fi
 exec python manage.py runserver 0.0.0.0:8000